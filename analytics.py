@@ -0,0 +1,184 @@
+"""
+Аналитика проектов и команд: burndown, пропускная способность, время цикла.
+
+Источник — журнал task_events, который пишут функции записи задач (crud,
+импорт, миграция схемы). Команда
+
+    flask --app app rollup-analytics
+
+(по расписанию, например раз в несколько минут из cron) сворачивает новые
+события в дневные итоги project_snapshots; уже свёрнутые события повторно
+не читаются. Отчёт берёт итоги за период одним запросом по первичному
+ключу, всё, что раньше периода, — одной суммой, и досчитывает ещё не
+свёрнутые события, поэтому он свежий и не зависит от длины истории.
+Ряды по дням складываются в массивы NumPy.
+
+Время цикла — от created до completed (до каждого, если задачу
+переоткрывали). Хранится гистограммой по корзинам CYCLE_BUCKETS_HOURS,
+перцентили оцениваются по ней с интерполяцией внутри корзины.
+"""
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, update, func, tuple_, bindparam
+from sqlalchemy.orm import Session
+
+from database import upsert
+from models import Project, TaskEvent, ProjectSnapshot
+
+CYCLE_BUCKETS_HOURS = np.array([1, 2, 4, 8, 16, 24, 48, 72, 120, 168, 240, 336, 504, 720, 1080, 1440, 2160, 4320, 8760])
+PERCENTILES = (50, 85, 95)
+ROLLUP_BATCH_SIZE = 5000
+ANALYTICS_DAYS = 90
+ANALYTICS_MAX_DAYS = 3650
+
+# Итоги дня — вектор: created, completed, reopened и гистограмма времени цикла
+# (последняя корзина — дольше CYCLE_BUCKETS_HOURS[-1])
+CREATED, COMPLETED, REOPENED, HIST = 0, 1, 2, 3
+WIDTH = HIST + len(CYCLE_BUCKETS_HOURS) + 1
+
+
+def _cycle_starts(db: Session, task_ids):
+    """Время created для задач; у задач с baseline его нет."""
+    if not task_ids:
+        return {}
+    return dict(db.execute(select(TaskEvent.task_id, func.min(TaskEvent.created_at))
+                           .where(TaskEvent.task_id.in_(task_ids), TaskEvent.kind == "created")
+                           .group_by(TaskEvent.task_id)).all())
+
+def aggregate(db: Session, events):
+    """События (task_id, project_id, kind, created_at) -> {(project_id, день): вектор итогов}."""
+    starts = _cycle_starts(db, {e.task_id for e in events if e.kind == "completed"})
+    totals = {}
+    for e in events:
+        key = (e.project_id, e.created_at.date())
+        vector = totals.get(key)
+        if vector is None:
+            vector = totals[key] = np.zeros(WIDTH, dtype=np.int64)
+        if e.kind in ("created", "baseline"):
+            vector[CREATED] += 1
+        elif e.kind == "completed":
+            vector[COMPLETED] += 1
+            start = starts.get(e.task_id)
+            if start is not None:
+                hours = max((e.created_at - start).total_seconds() / 3600, 0)
+                vector[HIST + np.searchsorted(CYCLE_BUCKETS_HOURS, hours)] += 1
+        elif e.kind == "reopened":
+            vector[REOPENED] += 1
+    return totals
+
+
+def _merge(db: Session, totals):
+    # Счётчики — одним INSERT ... ON CONFLICT DO UPDATE: две свёртки, впервые пишущие один и тот же
+    # день, не столкнутся на первичном ключе. Строка заблокирована до коммита, поэтому гистограмму
+    # можно затем прочитать и дописать, не боясь перезаписать прибавленное параллельной свёрткой
+    table = ProjectSnapshot.__table__
+    stmt = upsert(db, table)
+    db.execute(stmt.on_conflict_do_update(index_elements=[table.c.project_id, table.c.day], set_={
+        name: table.c[name] + stmt.excluded[name] for name in ("created", "completed", "reopened")}), [
+        {"project_id": project_id, "day": day, "created": int(vector[CREATED]),
+         "completed": int(vector[COMPLETED]), "reopened": int(vector[REOPENED])}
+        for (project_id, day), vector in totals.items()])
+    hists = {key: vector[HIST:] for key, vector in totals.items() if vector[HIST:].any()}
+    if not hists:
+        return
+    rows = db.execute(select(table.c.project_id, table.c.day, table.c.cycle_hist)
+                      .where(tuple_(table.c.project_id, table.c.day).in_(list(hists)))).all()
+    merged = []
+    for r in rows:
+        hist = hists[(r.project_id, r.day)]
+        if r.cycle_hist:
+            hist = hist + np.array(json.loads(r.cycle_hist))
+        merged.append({"key_project_id": r.project_id, "key_day": r.day, "cycle_hist": json.dumps(hist.tolist())})
+    db.execute(update(table).where(table.c.project_id == bindparam("key_project_id"),
+                                   table.c.day == bindparam("key_day")), merged)
+
+def rollup(db: Session, batch_size: int = ROLLUP_BATCH_SIZE):
+    """Сворачивает новые события в project_snapshots. Коммит на пачку; возвращает число событий."""
+    done = 0
+    while True:
+        pending = (select(TaskEvent.event_id).where(TaskEvent.rolled_up == False)
+                   .order_by(TaskEvent.event_id).limit(batch_size))
+        # Пачка забирается одним UPDATE ... RETURNING: параллельная свёртка тех же событий не получит
+        events = db.execute(update(TaskEvent.__table__)
+                            .where(TaskEvent.rolled_up == False, TaskEvent.event_id.in_(pending))
+                            .values(rolled_up=True)
+                            .returning(TaskEvent.task_id, TaskEvent.project_id, TaskEvent.kind,
+                                       TaskEvent.created_at)).all()
+        if not events:
+            return done
+        _merge(db, aggregate(db, events))
+        db.commit()
+        done += len(events)
+        if len(events) < batch_size:
+            return done
+
+
+def _series(db: Session, project_ids, start, days):
+    """Матрица итогов days x WIDTH с дня start и число открытых задач на его начало."""
+    vectors = np.zeros((days, WIDTH), dtype=np.int64)
+    end = start + timedelta(days=days - 1)
+    # Ещё не свёрнутые события читаем первыми: свёртка между запросами может
+    # на миг посчитать их дважды, но не потеряет
+    pending = db.execute(select(TaskEvent.task_id, TaskEvent.project_id, TaskEvent.kind, TaskEvent.created_at)
+                         .where(TaskEvent.rolled_up == False, TaskEvent.project_id.in_(project_ids))).all()
+    rows = db.execute(select(ProjectSnapshot.day, ProjectSnapshot.created, ProjectSnapshot.completed,
+                             ProjectSnapshot.reopened, ProjectSnapshot.cycle_hist)
+                      .where(ProjectSnapshot.project_id.in_(project_ids),
+                             ProjectSnapshot.day.between(start, end))).all()
+    opened = db.execute(select(func.coalesce(func.sum(
+        ProjectSnapshot.created - ProjectSnapshot.completed + ProjectSnapshot.reopened), 0))
+        .where(ProjectSnapshot.project_id.in_(project_ids), ProjectSnapshot.day < start)).scalar()
+    if rows:
+        index = np.fromiter(((r.day - start).days for r in rows), dtype=np.intp, count=len(rows))
+        np.add.at(vectors[:, :HIST], index, np.array([(r.created, r.completed, r.reopened) for r in rows]))
+        with_hist = [i for i, r in enumerate(rows) if r.cycle_hist]
+        if with_hist:
+            np.add.at(vectors[:, HIST:], index[with_hist], np.array([json.loads(rows[i].cycle_hist) for i in with_hist]))
+    for (_, day), vector in aggregate(db, pending).items():
+        if day < start:
+            opened += int(vector[CREATED] - vector[COMPLETED] + vector[REOPENED])
+        elif day <= end:
+            vectors[(day - start).days] += vector
+    return vectors, opened
+
+def _percentiles(hist):
+    total = hist.sum()
+    if not total:
+        return {f"p{p}": None for p in PERCENTILES}
+    cum = np.cumsum(hist)
+    ranks = np.array(PERCENTILES) / 100 * total
+    buckets = np.searchsorted(cum, ranks)
+    lower = np.concatenate(([0], CYCLE_BUCKETS_HOURS))[buckets]
+    upper = np.concatenate((CYCLE_BUCKETS_HOURS, CYCLE_BUCKETS_HOURS[-1:]))[buckets]
+    below = np.concatenate(([0], cum))[buckets]
+    values = lower + (upper - lower) * (ranks - below) / hist[buckets]
+    return {f"p{p}": round(float(v), 1) for p, v in zip(PERCENTILES, values)}
+
+def report(db: Session, project_ids, days: int = ANALYTICS_DAYS, today=None):
+    """Burndown, пропускная способность по неделям и перцентили времени цикла за последние days дней."""
+    end = today or datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    vectors, opened = _series(db, list(project_ids), start, days)
+    created, completed, reopened = vectors[:, CREATED], vectors[:, COMPLETED], vectors[:, REOPENED]
+    # Недели считаются от конца периода; первая может быть неполной
+    weekly = np.concatenate((np.zeros(-days % 7, dtype=np.int64), completed)).reshape(-1, 7).sum(axis=1)
+    hist = vectors[:, HIST:].sum(axis=0)
+    return {
+        "from": start,
+        "to": end,
+        "days": [start + timedelta(days=i) for i in range(days)],
+        "open": (opened + np.cumsum(created - completed + reopened)).tolist(),
+        "created": created.tolist(),
+        "completed": completed.tolist(),
+        "reopened": reopened.tolist(),
+        "throughput": {
+            "weeks": [max(start, end - timedelta(days=7 * i + 6)) for i in reversed(range(len(weekly)))],
+            "completed": weekly.tolist(),
+        },
+        "cycle_time_hours": {"count": int(hist.sum()), **_percentiles(hist)},
+    }
+
+def get_team_project_ids(db: Session, team_id: int):
+    return db.execute(select(Project.project_id).where(Project.team_id == team_id)).scalars().all()
@@ -0,0 +1,215 @@
+"""
+JSON API v1 для интеграций (только чтение).
+
+    GET /api/v1/tasks?project_id=1&fields=title,is_completed&limit=1000
+    GET /api/v1/tasks?project_id=1&after=<next_cursor>
+    GET /api/v1/tasks?ids=5,8,13
+    GET /api/v1/tasks/5
+    GET /api/v1/me/tasks?after=<next_cursor>
+    GET /api/v1/analytics/projects/1?days=90
+    GET /api/v1/analytics/teams/2?days=365
+
+Ресурсы: projects, tasks, comments, attachments (файл вложения — /files/<attachment_id>)
+и archived_tasks, archived_comments, archived_attachments.
+Список отдаётся как {"data": [...], "next_cursor": id | null}: курсор — первичный
+ключ последней строки, поэтому страницы не съезжают при вставках и не дорожают
+с глубиной. fields= превращается в SELECT только этих колонок (первичный ключ
+есть всегда). Если установлен orjson, ответы сериализует он.
+
+me/tasks — открытые задачи текущего пользователя в порядке страницы "Мои задачи"
+(просроченные первыми); курсор там — строка, а не id.
+
+analytics/* — burndown, пропускная способность и время цикла проекта или
+всех проектов команды (analytics.py).
+"""
+import json
+import os
+
+from flask import Blueprint, Response, abort, current_app, request
+from flask_login import login_required, current_user
+from werkzeug.exceptions import HTTPException
+
+from models import Team, Project, Task, Comment, Attachment, ArchivedTask, ArchivedComment, ArchivedAttachment
+from crud import (
+    get_rows_page, get_rows_by_ids, get_my_tasks_page, format_my_tasks_cursor, parse_my_tasks_cursor, overdue_before
+)
+import analytics
+
+try:
+    import orjson
+except ImportError: # Необязательная зависимость: без неё работает стандартный json
+    orjson = None
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "1000"))
+API_MAX_IDS = 1000
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+class Resource:
+    def __init__(self, model, hidden=(), filters=()):
+        self.pk = model.__mapper__.primary_key[0]
+        self.fields = {c.key: c for c in model.__table__.columns if c.key not in hidden}
+        self.filters = filters
+
+    def columns(self, fields_arg):
+        """Колонки для SELECT по параметру fields= (по умолчанию — все открытые)."""
+        if not fields_arg:
+            return list(self.fields.values())
+        names = [name.strip() for name in fields_arg.split(",") if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            abort(400, f"Неизвестные поля: {', '.join(unknown)}")
+        return [self.pk] + [self.fields[name] for name in dict.fromkeys(names) if self.fields[name] is not self.pk]
+
+
+RESOURCES = {
+    "projects": Resource(Project, filters=("team_id",)),
+    "tasks": Resource(Task, filters=("project_id", "assignee_id", "priority_id", "status_id", "is_completed")),
+    "comments": Resource(Comment, filters=("task_id", "user_id")),
+    "attachments": Resource(Attachment, hidden=("file_path",), filters=("task_id",)),
+    # Архив выполненных задач (archive.py) — отдельные ресурсы, в основные списки не попадает
+    "archived_tasks": Resource(ArchivedTask, filters=("project_id", "assignee_id")),
+    "archived_comments": Resource(ArchivedComment, filters=("task_id",)),
+    "archived_attachments": Resource(ArchivedAttachment, hidden=("file_path",), filters=("task_id",)),
+}
+
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype="application/json")
+
+def _records(columns, rows):
+    names = [c.key for c in columns]
+    return [dict(zip(names, row)) for row in rows]
+
+
+def _resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        abort(404, f"Нет ресурса {name}")
+    return resource
+
+def _int_arg(name, default=None):
+    value = request.args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, f"{name} должен быть целым числом")
+
+def _criteria(resource):
+    criteria = []
+    for name in resource.filters:
+        if name not in request.args:
+            continue
+        column = resource.fields[name]
+        if name == "is_completed":
+            criteria.append(column == (request.args[name].lower() in ("1", "true", "yes")))
+        else:
+            criteria.append(column == _int_arg(name))
+    return criteria
+
+def _session():
+    return current_app.extensions["api_read_session"]()
+
+
+@bp.get("/<name>")
+@login_required
+def list_items(name):
+    resource = _resource(name)
+    columns = resource.columns(request.args.get("fields"))
+    db = _session()
+
+    # Пакетное чтение по списку id: ?ids=1,2,3
+    if "ids" in request.args:
+        try:
+            ids = [int(i) for i in request.args["ids"].split(",") if i.strip()]
+        except ValueError:
+            abort(400, "ids — список целых чисел через запятую")
+        if len(ids) > API_MAX_IDS:
+            abort(400, f"Не больше {API_MAX_IDS} id за запрос")
+        rows = get_rows_by_ids(db, resource.pk, columns, set(ids)) if ids else []
+        found = {row[0] for row in rows}
+        return json_response({"data": _records(columns, rows), "missing": [i for i in ids if i not in found]})
+
+    limit = max(1, min(_int_arg("limit", API_PAGE_SIZE), API_MAX_PAGE_SIZE))
+    # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+    rows = get_rows_page(db, resource.pk, columns, _criteria(resource), _int_arg("after"), limit + 1)
+    next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+    return json_response({"data": _records(columns, rows[:limit]), "next_cursor": next_cursor})
+
+@bp.get("/<name>/<int:item_id>")
+@login_required
+def get_item(name, item_id):
+    resource = _resource(name)
+    columns = resource.columns(request.args.get("fields"))
+    rows = get_rows_by_ids(_session(), resource.pk, columns, [item_id])
+    if not rows:
+        abort(404, "Не найдено")
+    return json_response(_records(columns, rows)[0])
+
+@bp.get("/me/tasks")
+@login_required
+def my_tasks():
+    limit = max(1, min(_int_arg("limit", API_PAGE_SIZE), API_MAX_PAGE_SIZE))
+    after = request.args.get("after")
+    cursor = parse_my_tasks_cursor(after)
+    if after and cursor is None:
+        abort(400, "Неверный курсор after")
+    tasks = get_my_tasks_page(_session(), current_user.user_id, cursor, limit + 1)
+    next_cursor = format_my_tasks_cursor(_session(), tasks[limit - 1]) if len(tasks) > limit else None
+    due = overdue_before()
+    return json_response({"data": [{
+        "task_id": t.task_id,
+        "title": t.title,
+        "project_id": t.project_id,
+        "due_date": t.due_date,
+        "priority_id": t.priority_id,
+        "status_id": t.status_id,
+        "overdue": t.due_date is not None and t.due_date < due,
+    } for t in tasks[:limit]], "next_cursor": next_cursor})
+
+def _days():
+    return max(1, min(_int_arg("days", analytics.ANALYTICS_DAYS), analytics.ANALYTICS_MAX_DAYS))
+
+@bp.get("/analytics/projects/<int:project_id>")
+@login_required
+def project_analytics(project_id):
+    db = _session()
+    if db.get(Project, project_id) is None:
+        abort(404, "Проект не найден")
+    return json_response({"project_id": project_id, **analytics.report(db, [project_id], _days())})
+
+@bp.get("/analytics/teams/<int:team_id>")
+@login_required
+def team_analytics(team_id):
+    db = _session()
+    if db.get(Team, team_id) is None:
+        abort(404, "Команда не найдена")
+    project_ids = analytics.get_team_project_ids(db, team_id)
+    return json_response({"team_id": team_id, "project_ids": project_ids,
+                          **analytics.report(db, project_ids, _days())})
+
+@bp.errorhandler(HTTPException)
+def api_error(e):
+    return json_response({"error": e.description, "status": e.code}, e.code)
+
+
+def install(app, read_session, login_manager):
+    """Регистрирует API; чтение идёт через read_session (реплика, если настроена)."""
+    app.extensions["api_read_session"] = read_session
+    # Без входа — 401 в JSON вместо редиректа на форму логина
+    login_manager.blueprint_login_views[bp.name] = None
+    app.register_blueprint(bp)
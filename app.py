@@ -1,79 +1,159 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+from flask import (
+    Flask, Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, send_from_directory, jsonify,
+    stream_with_context, abort, session, make_response
+)
 from werkzeug.utils import secure_filename
+from jinja2.filters import do_filesizeformat
 from sqlalchemy.orm import scoped_session
-from datetime import datetime
+from datetime import datetime, timedelta
+import io
+import mimetypes
 import os
+import time
+
+import click
 
 from flask_login import LoginManager, login_user, logout_user, current_user, login_required
-from flask_bcrypt import Bcrypt
 
-from database import Base, engine, SessionLocal
+from database import engine, replica_engine, SessionLocal, ReplicaSessionLocal
+from bootstrap import bootstrap, check_schema, SCHEMA_VERSION
+from auth import load_principal, user_cache
+from passwords import PasswordBackendBusy, needs_rehash
+from importer import IMPORTERS, DEFAULT_BATCH_SIZE, detect_format
+from export import iter_task_chunks, stream_csv, stream_ndjson
+from storage import BLOB_GC_GRACE_SECONDS, save_stream
+import search as search_index
+from events import broker, BrokerFull, RESET
+from fragments import fragment_cache, render_fragment, page_etag, not_modified, set_page_etag
+import instrumentation
+import api
+import writebatch
+from archive import (
+    ARCHIVE_AFTER_DAYS, archive_completed, restore_task, get_archived_tasks, get_archived_task_project
+)
+from analytics import rollup
 from models import User, Team, Project, Task, Priority, Status, Role, Comment, Attachment
 from crud import (
-    create_initial_data, create_user, create_team, create_project, create_task,
-    create_comment, create_attachment, get_users, get_teams, get_projects,
+    create_user, create_team, create_project, create_task,
+    create_comment, create_attachment, gc_blobs, search_users, get_teams, get_projects,
     get_projects_by_team, get_tasks_by_project, get_comments_for_task, get_attachments_for_task,
     get_roles, create_role, get_user_by_email, get_user_by_id, verify_password,
-    get_project_by_id, get_task_by_id # Добавлено
+    get_project_by_id, get_task_by_id, # Добавлено
+    get_projects_page, get_tasks_page, get_project_choices, get_dashboard_stats,
+    flip_task_completed, bulk_update_tasks, BULK_FIELDS, unknown_bulk_fields, rebuild_counters,
+    get_priorities, get_statuses, get_role_by_name, refdata_cache, update_user_password,
+    get_attachment_by_id, get_project_version, get_task_version, get_comments_page,
+    get_my_tasks_page, format_my_tasks_cursor, parse_my_tasks_cursor, count_overdue_tasks, overdue_before
 )
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "files")
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-app = Flask(__name__)
-app.config["SECRET_KEY"] = "dev-secret-key"
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+DASHBOARD_PAGE_SIZE = 50
+COMMENTS_PAGE_SIZE = 50
+ARCHIVE_PAGE_SIZE = 100
+MY_TASKS_PAGE_SIZE = 50
+BULK_MAX_TASKS = 1000
+# Сколько секунд после записи пользователь читает с основной БД, а не с реплики
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# Как часто воркер с устаревшей схемой проверяет её снова (см. create_app)
+SCHEMA_RECHECK_SECONDS = float(os.getenv("SCHEMA_RECHECK_SECONDS", "10"))
+
+# Маршруты и команды регистрируются на blueprint, приложение собирает create_app()
+bp = Blueprint("main", __name__, cli_group=None)
 
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = "login"
+login_manager.login_view = "main.login"
 login_manager.login_message = "Пожалуйста, войдите, чтобы получить доступ к этой странице."
 login_manager.login_message_category = "warning"
 
-bcrypt = Bcrypt(app)
-
-Base.metadata.create_all(bind=engine)
-
 db_session = scoped_session(SessionLocal)
+replica_session = scoped_session(ReplicaSessionLocal)
 
-with app.app_context():
-    create_initial_data(db_session())
+# Сессия для страниц только на чтение: реплика, если она настроена и пользователь
+# ничего не записывал в последние READ_YOUR_WRITES_SECONDS секунд
+def read_session():
+    if replica_engine is engine or session.get("wrote_at", 0) + READ_YOUR_WRITES_SECONDS > time.time():
+        return db_session()
+    return replica_session()
 
-@app.teardown_appcontext
 def remove_session(exception=None):
     db_session.remove()
+    replica_session.remove()
+
+# Успешный POST — запись в основную БД; запоминаем время для read-your-writes
+@bp.after_app_request
+def remember_write(response):
+    if request.method == "POST" and response.status_code < 400:
+        session["wrote_at"] = time.time()
+    return response
 
 @login_manager.user_loader
 def load_user(user_id):
-    db = db_session()
-    return get_user_by_id(db, int(user_id))
+    db = read_session()
+    return load_principal(db, int(user_id))
 
-@app.route("/")
+# Значок просроченных задач в шапке (base.html); число кэшируется (crud.count_overdue_tasks)
+@bp.app_context_processor
+def inject_overdue_count():
+    if not current_user.is_authenticated:
+        return {}
+    return {"overdue_count": count_overdue_tasks(read_session(), current_user.user_id)}
+
+@bp.route("/")
 @login_required
 def dashboard():
-    db = db_session()
-    projects = get_projects(db) # Используем get_projects из crud
-    tasks = db.query(Task).all() # Пока не будем жадно загружать для дашборда, чтобы не перегружать
-    users = get_users(db)
+    db = read_session()
+    # Курсоры keyset-пагинации: id последней показанной строки
+    projects_after = request.args.get("projects_after", type=int)
+    tasks_after = request.args.get("tasks_after", type=int)
+
+    # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+    projects = get_projects_page(db, projects_after, DASHBOARD_PAGE_SIZE + 1)
+    tasks = get_tasks_page(db, tasks_after, DASHBOARD_PAGE_SIZE + 1)
+    next_projects_after = projects[DASHBOARD_PAGE_SIZE - 1].project_id if len(projects) > DASHBOARD_PAGE_SIZE else None
+    next_tasks_after = tasks[DASHBOARD_PAGE_SIZE - 1].task_id if len(tasks) > DASHBOARD_PAGE_SIZE else None
+    projects = projects[:DASHBOARD_PAGE_SIZE]
+    tasks = tasks[:DASHBOARD_PAGE_SIZE]
+
+    project_choices = get_project_choices(db) # Для выпадающего списка проектов в форме новой задачи
     teams = get_teams(db)
-    priorities = db.query(Priority).all()
-    statuses = db.query(Status).all()
-
-    stats = {
-        "projects": len(projects),
-        "tasks": len(tasks),
-        "users": len(users),
-        "teams": len(teams),
-        "tasks_done": db.query(Task).filter(Task.is_completed == True).count(),
-    }
-    return render_template("index.html", projects=projects, tasks=tasks, users=users, teams=teams,
-                           priorities=priorities, statuses=statuses, stats=stats, current_user=current_user)
+    priorities = get_priorities(db)
+    statuses = get_statuses(db)
+
+    stats = get_dashboard_stats(db)
+    return render_template("index.html", projects=projects, tasks=tasks, teams=teams,
+                           priorities=priorities, statuses=statuses, stats=stats, current_user=current_user,
+                           project_choices=project_choices,
+                           projects_after=projects_after, tasks_after=tasks_after,
+                           next_projects_after=next_projects_after, next_tasks_after=next_tasks_after)
+
+@bp.route("/my-tasks")
+@login_required
+def my_tasks():
+    db = read_session()
+    after = request.args.get("after")
+    tasks = get_my_tasks_page(db, current_user.user_id, parse_my_tasks_cursor(after), MY_TASKS_PAGE_SIZE + 1)
+    next_after = format_my_tasks_cursor(db, tasks[MY_TASKS_PAGE_SIZE - 1]) if len(tasks) > MY_TASKS_PAGE_SIZE else None
+    return render_template("my_tasks.html", tasks=tasks[:MY_TASKS_PAGE_SIZE], after=after, next_after=next_after,
+                           overdue_before=overdue_before())
 
 # ---- Аутентификация ----
-@app.route("/login", methods=["GET", "POST"])
+# Пул bcrypt переполнен: отвечаем сразу, а не занимаем поток ожиданием.
+# Страницы с формой пароля показываем заново; форма добавления пользователя — на дашборде
+PASSWORD_FORMS = {"main.login": "login.html", "main.register": "register.html"}
+
+@bp.app_errorhandler(PasswordBackendBusy)
+def password_backend_busy(e):
+    flash("Сервер перегружен, попробуйте ещё раз через несколько секунд.", "warning")
+    template = PASSWORD_FORMS.get(request.endpoint)
+    if template is None:
+        return redirect(url_for("main.dashboard"))
+    return render_template(template), 503, {"Retry-After": "2"}
+
+
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
 
     if request.method == "POST":
         email = request.form.get("email", "").strip()
@@ -82,25 +162,28 @@ def login():
         user = get_user_by_email(db, email)
 
         if user and verify_password(user.password, password):
+            # Хэш со старой стоимостью bcrypt прозрачно обновляется
+            if needs_rehash(user.password):
+                update_user_password(db, user, password)
             login_user(user)
             flash("Вы успешно вошли в систему.", "success")
             next_page = request.args.get("next")
-            return redirect(next_page or url_for("dashboard"))
+            return redirect(next_page or url_for("main.dashboard"))
         else:
             flash("Неверный email или пароль.", "danger")
     return render_template("login.html")
 
-@app.route("/logout")
+@bp.route("/logout")
 @login_required
 def logout():
     logout_user()
     flash("Вы вышли из системы.", "info")
-    return redirect(url_for("login"))
+    return redirect(url_for("main.login"))
 
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
 
     if request.method == "POST":
         first_name = request.form.get("first_name", "").strip()
@@ -111,44 +194,83 @@ def register():
         db = db_session()
         if get_user_by_email(db, email):
             flash("Пользователь с таким email уже существует.", "danger")
-            return redirect(url_for("register"))
+            return redirect(url_for("main.register"))
 
-        viewer_role = db.query(Role).filter_by(name="viewer").first()
+        viewer_role = get_role_by_name(db, "viewer")
         role_id = viewer_role.role_id if viewer_role else None
 
         create_user(db, first_name, last_name, email, password, role_id)
         flash("Регистрация прошла успешно! Теперь вы можете войти.", "success")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
     return render_template("register.html")
 
 
 # -------- Projects --------
-@app.route("/projects/<int:project_id>")
+@bp.route("/projects/<int:project_id>")
 @login_required
 def project_detail(project_id):
-    db = db_session()
-    project = get_project_by_id(db, project_id) # Используем новую функцию
-    if not project:
+    db = read_session()
+    # Сначала только версия: если страница не менялась, отвечаем 304 без загрузки данных
+    version = get_project_version(db, project_id)
+    if not version:
         flash("Проект не найден.", "danger")
-        return redirect(url_for("dashboard"))
-
-    # Задачи для этого проекта уже загружены через joinedload в get_project_by_id,
-    # но для удобства передачи в шаблон можно использовать project.tasks
-    # Если хотим отфильтровать или отсортировать, можно использовать get_tasks_by_project(db, project_id)
-    tasks = get_tasks_by_project(db, project_id) # Используем эту функцию для получения задач с жадной загрузкой
+        return redirect(url_for("main.dashboard"))
+    etag = page_etag("p", project_id, *version, _overdue_badge())
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    users = get_users(db) # Для выпадающего списка исполнителей в форме новой задачи
-    priorities = db.query(Priority).all() # Для выпадающего списка приоритетов
-    statuses = db.query(Status).all() # Для выпадающего списка статусов
-
-    return render_template("project_detail.html",
-                           project=project,
-                           tasks=tasks,
-                           users=users,
-                           priorities=priorities,
-                           statuses=statuses)
-
-@app.post("/projects/add")
+    project = get_project_by_id(db, project_id) # Используем новую функцию
+    # Таблица задач рендерится один раз на версию проекта
+    task_table = render_fragment(("project_tasks", project_id, version.version), "_project_tasks.html",
+                                 lambda: {"tasks": get_tasks_by_project(db, project_id)})
+
+    # Архив показываем только по запросу (?archived=1), постранично от новых к старым
+    show_archived = request.args.get("archived") == "1"
+    archived, archived_before = [], None
+    if show_archived:
+        archived = get_archived_tasks(db, project_id, request.args.get("archived_before", type=int), ARCHIVE_PAGE_SIZE + 1)
+        if len(archived) > ARCHIVE_PAGE_SIZE:
+            archived_before = archived[ARCHIVE_PAGE_SIZE - 1].task_id
+        archived = archived[:ARCHIVE_PAGE_SIZE]
+
+    priorities = get_priorities(db) # Для выпадающего списка приоритетов
+    statuses = get_statuses(db) # Для выпадающего списка статусов
+
+    response = make_response(render_template("project_detail.html",
+                                             project=project,
+                                             task_table=task_table,
+                                             show_archived=show_archived,
+                                             archived=archived,
+                                             archived_before=archived_before,
+                                             page_version=version.version,
+                                             priorities=priorities,
+                                             statuses=statuses))
+    return set_page_etag(response, etag)
+
+@bp.get("/projects/<int:project_id>/export")
+@login_required
+def export_project(project_id):
+    db = read_session()
+    if not db.query(Project.project_id).filter(Project.project_id == project_id).first():
+        abort(404)
+    fmt = request.args.get("format", "csv")
+    with_comments = request.args.get("comments") == "1"
+    with_attachments = request.args.get("attachments") == "1"
+
+    # Генератор отдаёт ответ частями; сессия живёт, пока поток не закончится
+    def file_url(attachment_id):
+        return url_for("main.serve_file", attachment_id=attachment_id, _external=True)
+    chunks = iter_task_chunks(db, project_id, with_comments, with_attachments, attachment_url=file_url)
+    if fmt == "ndjson":
+        body, mimetype, ext = stream_ndjson(chunks), "application/x-ndjson", "ndjson"
+    else:
+        body, mimetype, ext = stream_csv(chunks, with_comments, with_attachments), "text/csv", "csv"
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename=project-{project_id}-tasks.{ext}"
+    })
+
+@bp.post("/projects/add")
 @login_required
 def add_project():
     name = request.form.get("name", "").strip()
@@ -159,29 +281,66 @@ def add_project():
     db = db_session()
     p = create_project(db, name, description, int(team_id) if team_id else None, due_date)
     flash("Проект создан", "success")
-    return redirect(url_for("project_detail", project_id=p.project_id)) # Перенаправляем на страницу проекта
+    return redirect(url_for("main.project_detail", project_id=p.project_id)) # Перенаправляем на страницу проекта
 
 
 # -------- Tasks --------
-@app.route("/tasks/<int:task_id>")
+@bp.route("/tasks/<int:task_id>")
 @login_required
 def task_detail(task_id):
-    db = db_session()
-    task = get_task_by_id(db, task_id) # Используем новую функцию
-    if not task:
+    db = read_session()
+    version = get_task_version(db, task_id)
+    if version is None:
+        archived_project_id = get_archived_task_project(db, task_id)
+        if archived_project_id is not None:
+            flash("Задача перенесена в архив — её можно восстановить.", "info")
+            return redirect(url_for("main.project_detail", project_id=archived_project_id, archived=1))
         flash("Задача не найдена.", "danger")
-        return redirect(url_for("dashboard"))
-
-    # Комментарии и вложения уже загружены через joinedload в get_task_by_id
-    comments = task.comments
-    attachments = task.attachments
+        return redirect(url_for("main.dashboard"))
+    etag = page_etag("t", task_id, version, _overdue_badge())
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    return render_template("task_detail.html",
-                           task=task,
-                           comments=comments,
-                           attachments=attachments)
-
-@app.post("/tasks/add")
+    task = get_task_by_id(db, task_id) # Используем новую функцию
+    # Курсор страницы комментариев: "<created_at>,<comment_id>" последнего показанного
+    comments_before = _parse_comment_cursor(request.args.get("comments_before"))
+    # Комментарии загружаются только при промахе кэша, вложения — отдельным запросом по индексу
+    comment_list = render_fragment(("task_comments", task_id, version, comments_before), "_task_comments.html",
+                                   lambda: _load_comments_page(db, task_id, comments_before))
+    attachments = get_attachments_for_task(db, task_id)
+
+    response = make_response(render_template("task_detail.html",
+                                             task=task,
+                                             comment_list=comment_list,
+                                             comments_before=comments_before,
+                                             page_version=version,
+                                             attachments=attachments))
+    return set_page_etag(response, etag)
+
+def _overdue_badge():
+    # Значок в шапке меняется независимо от версии страницы — входит в её ETag
+    return f"o{count_overdue_tasks(read_session(), current_user.user_id)}"
+
+def _parse_comment_cursor(value):
+    if not value:
+        return None
+    created_at, _, comment_id = value.rpartition(",")
+    try:
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except ValueError:
+        return None
+
+def _load_comments_page(db, task_id, before):
+    # Берём на одну строку больше, чтобы понять, есть ли более ранние комментарии
+    comments = get_comments_page(db, task_id, before, COMMENTS_PAGE_SIZE + 1)
+    next_before = None
+    if len(comments) > COMMENTS_PAGE_SIZE:
+        last = comments[COMMENTS_PAGE_SIZE - 1]
+        next_before = f"{last.created_at.isoformat()},{last.comment_id}"
+    return {"task_id": task_id, "comments": comments[:COMMENTS_PAGE_SIZE], "next_before": next_before}
+
+@bp.post("/tasks/add")
 @login_required
 def add_task():
     title = request.form.get("title", "").strip()
@@ -201,72 +360,207 @@ def add_task():
                 due_date)
     flash("Задача создана", "success")
     # Перенаправляем на страницу проекта, из которого была добавлена задача
-    return redirect(url_for("project_detail", project_id=project_id))
+    return redirect(url_for("main.project_detail", project_id=project_id))
 
-@app.post("/tasks/<int:task_id>/toggle")
+@bp.post("/tasks/<int:task_id>/toggle")
 @login_required
 def toggle_task(task_id):
     db = db_session()
-    t = db.query(Task).get(task_id)
+    t = writebatch.execute(db, flip_task_completed, task_id)
     if t:
-        t.is_completed = not t.is_completed
-        db.commit()
+        event = {"task_id": task_id, "is_completed": t.is_completed}
+        broker.publish(f"task:{task_id}", "task", event)
+        broker.publish(f"project:{t.project_id}", "task", event)
         flash("Статус задачи обновлён", "info")
-    # Перенаправляем на страницу задачи, если пришли оттуда, иначе на дашборд
+    # Перенаправляем на страницу задачи или "Мои задачи", если пришли оттуда, иначе на дашборд
     if request.referrer and f"/tasks/{task_id}" in request.referrer:
-        return redirect(url_for("task_detail", task_id=task_id))
-    return redirect(url_for("dashboard"))
+        return redirect(url_for("main.task_detail", task_id=task_id))
+    if request.referrer and "/my-tasks" in request.referrer:
+        return redirect(url_for("main.my_tasks"))
+    return redirect(url_for("main.dashboard"))
+
+
+# Массовое изменение выбранных задач (флажки в таблице проекта): флаг "готово",
+# статус, приоритет, исполнитель. Пустое значение — не менять, "none" — очистить поле.
+@bp.post("/tasks/bulk")
+@login_required
+def bulk_update():
+    project_id = request.form.get("project_id", type=int)
+    back = url_for("main.project_detail", project_id=project_id) if project_id else url_for("main.dashboard")
+    try:
+        task_ids = {int(i) for i in request.form.getlist("task_ids")}
+        fields = {name: None if request.form[name] == "none" else int(request.form[name])
+                  for name in BULK_FIELDS if request.form.get(name)}
+    except ValueError:
+        abort(400)
+    if not task_ids:
+        flash("Не выбрано ни одной задачи", "warning")
+        return redirect(back)
+    if len(task_ids) > BULK_MAX_TASKS:
+        flash(f"За раз можно изменить не больше {BULK_MAX_TASKS} задач", "warning")
+        return redirect(back)
+    db = db_session()
+    if unknown_bulk_fields(db, fields):
+        flash("Выбран несуществующий статус, приоритет или исполнитель", "danger")
+        return redirect(back)
+    is_completed = {"1": True, "0": False}.get(request.form.get("is_completed", ""))
+
+    toggled, changed = bulk_update_tasks(db, task_ids, is_completed, **fields)
+    for t in toggled:
+        event = {"task_id": t.task_id, "is_completed": t.is_completed}
+        broker.publish(f"task:{t.task_id}", "task", event)
+        broker.publish(f"project:{t.project_id}", "task", event)
+    # Исполнитель, статус и приоритет на месте не обновляются — открытые страницы перезагрузятся
+    for t in changed:
+        broker.publish(f"task:{t.task_id}", "reset", {})
+    for project in {t.project_id for t in changed}:
+        broker.publish(f"project:{project}", "reset", {})
+    flash(f"Изменено задач: {len({t.task_id for t in toggled + changed})}", "success")
+    return redirect(back)
+
+@bp.post("/tasks/<int:task_id>/restore")
+@login_required
+def restore_archived_task(task_id):
+    if restore_task(db_session(), task_id) is None:
+        flash("Задачи нет в архиве.", "warning")
+        return redirect(url_for("main.dashboard"))
+    flash("Задача восстановлена из архива", "success")
+    return redirect(url_for("main.task_detail", task_id=task_id))
 
 
 # -------- Comments --------
-@app.post("/comments/add")
+@bp.post("/comments/add")
 @login_required
 def add_comment():
     task_id = int(request.form.get("task_id"))
     user_id = current_user.user_id
     content = request.form.get("content", "").strip()
     db = db_session()
-    create_comment(db, task_id, user_id, content)
+    comment = writebatch.execute(db, create_comment, task_id, user_id, content)
+    broker.publish(f"task:{task_id}", "comment", {
+        "comment_id": comment.comment_id,
+        "author": f"{current_user.first_name} {current_user.last_name}",
+        "content": comment.content,
+        "created_at": comment.created_at.strftime('%Y-%m-%d %H:%M'),
+    })
     flash("Комментарий добавлен", "success")
-    return redirect(url_for("task_detail", task_id=task_id)) # Перенаправляем на страницу задачи
+    return redirect(url_for("main.task_detail", task_id=task_id)) # Перенаправляем на страницу задачи
 
 
 # -------- Attachments --------
-@app.post("/attachments/upload")
+@bp.post("/attachments/upload")
 @login_required
 def upload_attachment():
     task_id = int(request.form.get("task_id"))
     file = request.files.get("file")
     if not file or file.filename == '':
         flash("Файл не выбран", "warning")
-        return redirect(url_for("task_detail", task_id=task_id)) # Перенаправляем на страницу задачи
+        return redirect(url_for("main.task_detail", task_id=task_id)) # Перенаправляем на страницу задачи
 
-    filename = secure_filename(file.filename)
-    save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(save_path)
+    # Файл пишется частями под путём по SHA-256; одинаковые файлы хранятся один раз.
+    # Если запись в БД не пройдёт, файл без ссылок позже удалит flask gc-blobs
+    sha256, size, rel_path, _ = save_stream(file.stream, current_app.config["UPLOAD_FOLDER"])
 
     db = db_session()
-    create_attachment(db, task_id, save_path)
+    att = create_attachment(db, task_id, rel_path, original_name=os.path.basename(file.filename), size=size, sha256=sha256)
+    broker.publish(f"task:{task_id}", "attachment", {
+        "attachment_id": att.attachment_id,
+        "name": att.original_name,
+        "size": do_filesizeformat(size),
+        "uploaded_at": att.uploaded_at.strftime('%Y-%m-%d %H:%M'),
+        "url": url_for("main.serve_file", attachment_id=att.attachment_id),
+    })
     flash("Файл загружен", "success")
-    return redirect(url_for("task_detail", task_id=task_id)) # Перенаправляем на страницу задачи
+    return redirect(url_for("main.task_detail", task_id=task_id)) # Перенаправляем на страницу задачи
+
+@bp.get("/files/<int:attachment_id>")
+@login_required
+def serve_file(attachment_id):
+    db = read_session()
+    att = get_attachment_by_id(db, attachment_id)
+    if not att:
+        abort(404)
+    # Старые вложения хранят абсолютный путь к файлу в UPLOAD_FOLDER
+    rel_path = att.file_path if att.sha256 else secure_filename(os.path.basename(att.file_path))
+    download_name = att.original_name or os.path.basename(att.file_path)
+    # Содержимое по хэшу неизменно: сильный ETag и долгий кэш в браузере.
+    # Для старых файлов ETag строится по mtime и размеру.
+    etag = att.sha256 or True
+    max_age = 365 * 24 * 3600 if att.sha256 else None
+
+    if current_app.config["FILES_OFFLOAD"] == "x-accel":
+        # nginx сам отдаёт файл и обрабатывает Range; здесь — только заголовки и 304
+        response = Response(mimetype=mimetypes.guess_type(download_name)[0] or "application/octet-stream")
+        response.headers["X-Accel-Redirect"] = current_app.config["FILES_ACCEL_PREFIX"] + rel_path
+        response.headers.set("Content-Disposition", "attachment", filename=download_name)
+        if att.sha256:
+            response.set_etag(att.sha256)
+            response.cache_control.max_age = max_age
+        response.cache_control.private = True
+        return response.make_conditional(request)
+
+    # conditional=True: If-None-Match -> 304 и Range -> 206 обрабатывает werkzeug;
+    # при USE_X_SENDFILE тело не копируется через воркер
+    response = send_from_directory(current_app.config["UPLOAD_FOLDER"], rel_path, as_attachment=True,
+                                   download_name=download_name, conditional=True, etag=etag, max_age=max_age)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+
+# -------- Live updates (SSE) --------
+def _event_stream(channel, load_version):
+    """
+    Поток событий канала. При первом подключении страница передаёт версию, с которой
+    отрисована: если данные успели измениться, клиент сразу получит reset.
+    """
+    try:
+        sub = broker.subscribe(channel, request.headers.get("Last-Event-ID"))
+    except BrokerFull:
+        return Response("Слишком много подключений, попробуйте позже.\n", status=503, mimetype="text/plain",
+                        headers={"Retry-After": "30"})
+    try:
+        # Версию читаем после подписки: запись между ними придёт событием, а не потеряется.
+        # Читаем из того же источника, что и страница (read_session), и сбрасываем, только если
+        # клиент отстал: отставшая реплика не должна гонять страницу по кругу reset -> перезагрузка
+        if "Last-Event-ID" not in request.headers:
+            version, client_version = load_version(), request.args.get("version", type=int)
+            if version is None or client_version is None or version > client_version:
+                sub.backlog = [RESET]
+    except Exception:
+        broker.unsubscribe(sub)
+        raise
+    # Сессия БД закрывается вместе с контекстом запроса, поток её не держит
+    response = Response(broker.stream(sub), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(lambda: broker.unsubscribe(sub))
+    return response
+
+@bp.get("/projects/<int:project_id>/events")
+@login_required
+def project_events(project_id):
+    def load_version():
+        row = get_project_version(read_session(), project_id)
+        return row.version if row else None
+    return _event_stream(f"project:{project_id}", load_version)
 
-@app.get("/files/<path:filename>")
+@bp.get("/tasks/<int:task_id>/events")
 @login_required
-def serve_file(filename):
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename, as_attachment=True)
+def task_events(task_id):
+    return _event_stream(f"task:{task_id}", lambda: get_task_version(read_session(), task_id))
 
 
 # -------- Reference data: Teams, Users, Roles --------
-@app.post("/teams/add")
+@bp.post("/teams/add")
 @login_required
 def add_team():
     name = request.form.get("team_name", "").strip()
     db = db_session()
     team = create_team(db, name)
     flash("Команда создана", "success")
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("main.dashboard"))
 
-@app.post("/users/add")
+@bp.post("/users/add")
 @login_required
 def add_user_view():
     first_name = request.form.get("first_name", "").strip()
@@ -278,12 +572,172 @@ def add_user_view():
 
     if get_user_by_email(db, email):
         flash("Пользователь с таким email уже существует.", "danger")
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
 
     user = create_user(db, first_name, last_name, email, password,
                 int(role_id) if role_id else None)
     flash("Пользователь создан", "success")
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("main.dashboard"))
+
+# Подсказки для поля исполнителя (templates/_assignee_input.html)
+@bp.get("/users/search")
+@login_required
+def search_users_json():
+    query = request.args.get("q", "")[:100]
+    return jsonify(search_users(read_session(), query, request.args.get("team_id", type=int)))
+
+# -------- Search --------
+@bp.get("/search")
+@login_required
+def search():
+    query = request.args.get("q", "").strip()
+    page = request.args.get("page", 1, type=int)
+    results, has_next = search_index.search(read_session(), query, page) if query else ([], False)
+    return render_template("search.html", query=query, results=results, page=page, has_next=has_next)
+
+
+# -------- Bulk import --------
+@bp.post("/import")
+@login_required
+def import_data():
+    kind = request.form.get("kind", "tasks")
+    file = request.files.get("file")
+    if kind not in IMPORTERS or not file or file.filename == '':
+        flash("Выберите файл и тип данных для импорта", "warning")
+        return redirect(url_for("main.dashboard"))
+
+    # Читаем загруженный файл потоком, не целиком
+    # surrogateescape: строка не в UTF-8 попадает в отчёт об ошибках, а не обрывает импорт
+    stream = io.TextIOWrapper(file.stream, encoding="utf-8-sig", errors="surrogateescape", newline="")
+    db = db_session()
+    report = IMPORTERS[kind](db, stream, detect_format(file.filename))
+    flash(f"Импорт завершён: {report.summary()}", "success" if not report.rows_failed else "warning")
+    for line_no, message in report.errors[:10]:
+        flash(f"Строка {line_no}: {message}", "danger")
+    return redirect(url_for("main.dashboard"))
+
+
+# -------- Diagnostics --------
+@bp.get("/internal/cache-stats")
+@login_required
+def cache_stats():
+    return jsonify({"refdata": refdata_cache.stats(), "users": user_cache.stats(), "fragments": fragment_cache.stats(),
+                    "events": broker.stats(), "writebatch": writebatch.batcher.stats()})
+
+
+# -------- Maintenance commands --------
+@bp.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """Пересчитывает таблицу счётчиков дашборда с нуля."""
+    stats = rebuild_counters(db_session())
+    db_session.remove()
+    print("Счётчики пересчитаны:", ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+@bp.cli.command("reindex-search")
+def reindex_search_command():
+    """Перестраивает полнотекстовый индекс задач и комментариев."""
+    search_index.rebuild(engine)
+    print("Поисковый индекс перестроен.")
+
+@bp.cli.command("import-data")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--kind", type=click.Choice(sorted(IMPORTERS)), default="tasks")
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default=None)
+@click.option("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+def import_data_command(path, kind, fmt, batch_size):
+    """Потоковый импорт задач или комментариев из CSV / NDJSON."""
+    with open(path, encoding="utf-8-sig", errors="surrogateescape", newline="") as stream:
+        report = IMPORTERS[kind](db_session(), stream, fmt or detect_format(path), batch_size)
+    db_session.remove()
+    for line_no, message in report.errors:
+        print(f"строка {line_no}: {message}")
+    print(f"Готово за {report.elapsed:.1f} с: {report.summary()}")
+
+@bp.cli.command("archive-tasks")
+@click.option("--days", type=int, default=ARCHIVE_AFTER_DAYS, show_default=True,
+              help="переносить задачи, выполненные больше стольких дней назад")
+@click.option("--batch-size", type=int, default=500)
+def archive_tasks_command(days, batch_size):
+    """Переносит давно выполненные задачи с комментариями и вложениями в архив."""
+    moved = archive_completed(db_session(), datetime.utcnow() - timedelta(days=days), batch_size)
+    db_session.remove()
+    print(f"В архив перенесено задач: {moved}")
+
+@bp.cli.command("rollup-analytics")
+def rollup_analytics_command():
+    """Сворачивает новые события задач в дневные итоги проектов (analytics.py)."""
+    events = rollup(db_session())
+    db_session.remove()
+    print(f"Свёрнуто событий: {events}")
+
+@bp.cli.command("gc-blobs")
+@click.option("--grace-hours", type=float, default=BLOB_GC_GRACE_SECONDS / 3600, show_default=True,
+              help="не трогать файлы, изменённые за последние столько часов")
+def gc_blobs_command(grace_hours):
+    """Удаляет файлы вложений, на которые не ссылается ни одна строка blobs."""
+    removed = gc_blobs(db_session(), current_app.config["UPLOAD_FOLDER"], int(grace_hours * 3600))
+    db_session.remove()
+    print(f"Удалено файлов без ссылок: {removed}")
+
+@bp.cli.command("bootstrap")
+def bootstrap_command():
+    """Создаёт/обновляет схему БД до текущей версии и заполняет справочники."""
+    before, after = bootstrap()
+    print(f"Схема БД: версия {before or 'нет'} -> {after}")
+
+
+def create_app():
+    """
+    Фабрика приложения. Никакой работы с БД, кроме одной проверки версии схемы:
+    создание таблиц и начальные данные — команда "flask bootstrap".
+    """
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-key")
+    app.config["UPLOAD_FOLDER"] = os.getenv("UPLOAD_FOLDER", UPLOAD_FOLDER)
+    # Отдача вложений фронтовым сервером: "" (сам Flask), "x-sendfile" (Apache/lighttpd)
+    # или "x-accel" (nginx, internal location с префиксом FILES_ACCEL_PREFIX)
+    app.config["FILES_OFFLOAD"] = os.getenv("FILES_OFFLOAD", "")
+    app.config["FILES_ACCEL_PREFIX"] = os.getenv("FILES_ACCEL_PREFIX", "/internal-files/")
+    app.config["USE_X_SENDFILE"] = app.config["FILES_OFFLOAD"] == "x-sendfile"
+
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+    api.install(app, read_session, login_manager) # JSON API /api/v1
+    app.teardown_appcontext(remove_session)
+
+    # Счётчики SQL на запрос, детектор N+1, /metrics и Server-Timing
+    instrumentation.install(app, engine, caches={"refdata": refdata_cache, "users": user_cache,
+                                               "fragments": fragment_cache})
+    if replica_engine is not engine:
+        instrumentation.install_engine(replica_engine)
+
+    # Единственный запрос к БД при старте воркера. Успешная проверка запоминается навсегда,
+    # неудачная повторяется не чаще раза в SCHEMA_RECHECK_SECONDS: после bootstrap (или если БД
+    # была недоступна при старте) воркер начинает отвечать без перезапуска
+    app.config["SCHEMA_OK"] = check_schema(engine)
+    checked_at = [time.monotonic()]
+    if not app.config["SCHEMA_OK"]:
+        app.logger.error("Схема БД не версии %s — выполните 'flask --app app bootstrap'", SCHEMA_VERSION)
+
+    @app.before_request
+    def require_schema():
+        if app.config["SCHEMA_OK"]:
+            return None
+        if time.monotonic() - checked_at[0] >= SCHEMA_RECHECK_SECONDS:
+            checked_at[0] = time.monotonic()
+            app.config["SCHEMA_OK"] = check_schema(engine)
+            if app.config["SCHEMA_OK"]:
+                return None
+        return Response("Схема БД устарела, выполните 'flask --app app bootstrap'.\n", status=503,
+                        mimetype="text/plain", headers={"Retry-After": str(int(SCHEMA_RECHECK_SECONDS) or 1)})
+
+    return app
+
+
+app = create_app()
 
 if __name__ == "__main__":
+    # Для локального запуска схема и справочники создаются автоматически
+    bootstrap()
+    app.config["SCHEMA_OK"] = True
     app.run(debug=True)
\ No newline at end of file
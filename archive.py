@@ -0,0 +1,96 @@
+"""
+Архив выполненных задач.
+
+Задачи, выполненные больше ARCHIVE_AFTER_DAYS дней назад, вместе с
+комментариями и вложениями переносятся в таблицы archived_* командой
+
+    flask --app app archive-tasks --days 90
+
+(запускается по расписанию, например из cron). Рабочая таблица tasks и её
+индексы остаются маленькими; страницы показывают архив только по запросу
+(?archived=1 на странице проекта), restore_task возвращает задачу обратно.
+
+Отдельные таблицы, а не партиции PostgreSQL: перевод существующей tasks
+в партиционированную требует пересоздания таблицы и включения ключа
+партиции в первичный ключ, а таблицы архива одинаково работают и на SQLite.
+"""
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, literal
+from sqlalchemy.orm import Session, joinedload
+
+from models import Task, Comment, Attachment, ArchivedTask, ArchivedComment, ArchivedAttachment
+from crud import bump_counter, bump_versions
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = 500
+
+
+def _copy(db: Session, source, target, task_ids, **extra):
+    """INSERT ... SELECT строк задач task_ids; колонки — общие для обеих таблиц плюс extra."""
+    common = [c.name for c in target.__table__.columns if c.name in source.__table__.c]
+    query = select(*[source.__table__.c[name] for name in common], *[literal(v) for v in extra.values()])
+    db.execute(insert(target.__table__).from_select(common + list(extra),
+                                                    query.where(source.__table__.c.task_id.in_(task_ids))))
+
+def _delete(db: Session, model, task_ids):
+    db.execute(delete(model.__table__).where(model.__table__.c.task_id.in_(task_ids)))
+
+
+def archive_completed(db: Session, older_than: datetime | None = None, batch_size: int = ARCHIVE_BATCH_SIZE):
+    """Переносит в архив задачи, выполненные до older_than. Коммит на каждую пачку. Возвращает число задач."""
+    if older_than is None:
+        older_than = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    criteria = [Task.is_completed == True, Task.completed_at < older_than]
+    moved = 0
+    while True:
+        rows = db.execute(select(Task.task_id, Task.project_id).where(*criteria)
+                          .order_by(Task.task_id).limit(batch_size)).all()
+        if not rows:
+            return moved
+        task_ids = [r.task_id for r in rows]
+        now = datetime.utcnow()
+        # Сначала задачи: архивные комментарии и вложения ссылаются на archived_tasks
+        _copy(db, Task, ArchivedTask, task_ids, archived_at=now)
+        _copy(db, Comment, ArchivedComment, task_ids)
+        _copy(db, Attachment, ArchivedAttachment, task_ids)
+        _delete(db, Attachment, task_ids)
+        _delete(db, Comment, task_ids)
+        _delete(db, Task, task_ids)
+        # Счётчики дашборда считают только рабочую таблицу
+        bump_counter(db, "tasks", -len(task_ids))
+        bump_counter(db, "tasks_done", -len(task_ids))
+        bump_versions(db, project_ids=[r.project_id for r in rows])
+        db.commit()
+        moved += len(task_ids)
+
+def restore_task(db: Session, task_id: int):
+    """Возвращает задачу из архива вместе с комментариями и вложениями. None, если её там нет."""
+    task = db.execute(select(ArchivedTask.project_id, ArchivedTask.is_completed)
+                      .where(ArchivedTask.task_id == task_id)).first()
+    if task is None:
+        return None
+    _copy(db, ArchivedTask, Task, [task_id])
+    _copy(db, ArchivedComment, Comment, [task_id])
+    _copy(db, ArchivedAttachment, Attachment, [task_id])
+    _delete(db, ArchivedAttachment, [task_id])
+    _delete(db, ArchivedComment, [task_id])
+    _delete(db, ArchivedTask, [task_id])
+    bump_counter(db, "tasks")
+    if task.is_completed:
+        bump_counter(db, "tasks_done")
+    bump_versions(db, task_ids=[task_id], project_ids=[task.project_id])
+    db.commit()
+    return task
+
+
+def get_archived_task_project(db: Session, task_id: int):
+    return db.execute(select(ArchivedTask.project_id).where(ArchivedTask.task_id == task_id)).scalar()
+
+# Архивные задачи проекта, новые сверху; keyset по task_id
+def get_archived_tasks(db: Session, project_id: int, before_id: int | None = None, limit: int = 100):
+    q = db.query(ArchivedTask).filter(ArchivedTask.project_id == project_id).options(joinedload(ArchivedTask.assignee))
+    if before_id is not None:
+        q = q.filter(ArchivedTask.task_id < before_id)
+    return q.order_by(ArchivedTask.task_id.desc()).limit(limit).all()
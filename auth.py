@@ -0,0 +1,51 @@
+import os
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from flask_login import UserMixin
+from cache import LRUCache
+from models import User, Role
+
+# Кэш пользователей для user_loader: на каждый аутентифицированный запрос
+# не нужно ходить в БД и собирать ORM-объект
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+user_cache = LRUCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+class UserPrincipal(UserMixin):
+    """Отсоединённое от сессии представление пользователя для current_user."""
+    __slots__ = ("user_id", "first_name", "last_name", "email", "role_id", "role_name")
+
+    def __init__(self, user_id, first_name, last_name, email, role_id, role_name):
+        self.user_id = user_id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+        self.role_id = role_id
+        self.role_name = role_name
+
+    def get_id(self):
+        return str(self.user_id)
+
+
+def _fetch_principal(db: Session, user_id: int):
+    row = db.execute(
+        select(User.user_id, User.first_name, User.last_name, User.email, User.role_id, Role.name)
+        .outerjoin(Role, User.role_id == Role.role_id)
+        .where(User.user_id == user_id)
+    ).first()
+    return UserPrincipal(*row) if row else None
+
+def load_principal(db: Session, user_id: int):
+    principal = user_cache.get(user_id)
+    if principal is None:
+        # Токен до чтения из БД: если invalidate_user() успеет между чтением и set(), старые данные не сохранятся
+        token = user_cache.token(user_id)
+        principal = _fetch_principal(db, user_id)
+        if principal is not None:
+            user_cache.set(user_id, principal, token)
+    return principal
+
+# Вызывается crud при создании или изменении пользователя
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
@@ -0,0 +1,68 @@
+"""
+Скорость отдачи вложений: Flask сам копирует байты или только ставит
+заголовок X-Sendfile / X-Accel-Redirect для фронтового сервера.
+
+    python -m benchmarks.bench_downloads --size-mb 20 --requests 50
+
+По умолчанию использует временную SQLite-базу; DATABASE_URL можно задать явно.
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    from bootstrap import bootstrap
+    bootstrap()
+    from app import app, db_session
+    from crud import create_project, create_task
+    from models import Attachment
+
+    app.config["UPLOAD_FOLDER"] = tempfile.mkdtemp()
+    db = db_session()
+    task = create_task(db, "bench", None, create_project(db, "bench", None, None, None).project_id, None, None, None, None)
+    task_id = task.task_id
+    db_session.remove()
+
+    client = app.test_client()
+    client.post("/login", data={"email": "admin@example.com", "password": "admin_password"})
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    client.post("/attachments/upload", data={"task_id": task_id, "file": (io.BytesIO(payload), "bench.bin")},
+                content_type="multipart/form-data")
+    attachment_id = db_session().query(Attachment.attachment_id).filter_by(task_id=task_id).scalar()
+    url = f"/files/{attachment_id}"
+    db_session.remove()
+
+    print(f"file={args.size_mb} MiB requests={args.requests}")
+    print(f"{'mode':>12} {'req/s':>8} {'worker MiB/s':>13}")
+    for mode in ("", "x-sendfile", "x-accel"):
+        app.config["FILES_OFFLOAD"] = mode
+        app.config["USE_X_SENDFILE"] = mode == "x-sendfile"
+        started = time.perf_counter()
+        sent = 0
+        for _ in range(args.requests):
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+            sent += len(response.get_data())
+        elapsed = time.perf_counter() - started
+        print(f"{mode or 'flask':>12} {args.requests / elapsed:>8.1f} {sent / elapsed / 2**20:>13.1f}")
+
+    # Повторный запрос с ETag: тело не передаётся совсем
+    app.config["FILES_OFFLOAD"] = ""
+    app.config["USE_X_SENDFILE"] = False
+    etag = client.get(url).headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+
+if __name__ == "__main__":
+    main()
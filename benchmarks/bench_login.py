@@ -0,0 +1,70 @@
+"""
+Пропускная способность /login при разных стоимостях bcrypt.
+
+    python -m benchmarks.bench_login --rounds 8 10 12 --threads 8 --requests 64
+
+По умолчанию использует временную SQLite-базу; DATABASE_URL можно задать явно.
+Если потоков больше PASSWORD_QUEUE_LIMIT, часть входов законно получает 503
+(пул bcrypt занят) — они считаются отдельно и в logins/s не входят.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.routes import patch_gevent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[8, 10, 12])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--gevent", action="store_true", help="как под воркером gevent (monkey-patching)")
+    args = parser.parse_args()
+    if args.gevent:
+        patch_gevent()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    import passwords
+    from bootstrap import bootstrap
+    bootstrap()
+    from app import app, db_session
+    from crud import get_user_by_email
+
+    email, password = "admin@example.com", "admin_password"
+    print(f"workers={passwords.PASSWORD_WORKERS} queue_limit={passwords.PASSWORD_QUEUE_LIMIT} "
+          f"threads={args.threads} requests={args.requests}")
+    print(f"{'rounds':>6} {'logins/s':>10} {'avg ms':>8} {'503':>5}")
+    for rounds in args.rounds:
+        # Хэш нужной стоимости, и та же стоимость в конфиге — чтобы не было перехэширования
+        passwords.BCRYPT_ROUNDS = rounds
+        db = db_session()
+        user = get_user_by_email(db, email)
+        user.password = passwords.hash_password(password)
+        db.commit()
+        db_session.remove()
+
+        def login(_):
+            client = app.test_client()
+            started = time.perf_counter()
+            response = client.post("/login", data={"email": email, "password": password})
+            assert response.status_code in (302, 503), response.status_code
+            return response.status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            results = list(pool.map(login, range(args.requests)))
+        elapsed = time.perf_counter() - started
+        latencies = [latency for status, latency in results if status == 302]
+        busy = len(results) - len(latencies)
+        avg = f"{1000 * sum(latencies) / len(latencies):>8.1f}" if latencies else f"{'-':>8}"
+        print(f"{rounds:>6} {len(latencies) / elapsed:>10.1f} {avg} {busy:>5}")
+    passwords.shutdown()
+
+
+if __name__ == "__main__":
+    main()
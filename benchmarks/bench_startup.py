@@ -0,0 +1,48 @@
+"""
+Время холодного старта воркера: импорт app и создание приложения
+в новом процессе, плюс первый запрос.
+
+    python -m benchmarks.bench_startup --runs 10
+
+По умолчанию использует временную SQLite-базу (инициализируется bootstrap
+заранее — так же, как при развёртывании); DATABASE_URL можно задать явно.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+booted = time.perf_counter()
+app.app.test_client().get("/login")
+print(json.dumps({"boot_ms": (booted - started) * 1000, "first_request_ms": (time.perf_counter() - booted) * 1000}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    subprocess.run([sys.executable, "-c", "from bootstrap import bootstrap; bootstrap()"], env=env, check=True,
+                   capture_output=True)
+
+    samples = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], env=env, check=True, capture_output=True, text=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    for key in ("boot_ms", "first_request_ms"):
+        values = [s[key] for s in samples]
+        print(f"{key:<18} median {statistics.median(values):7.1f}  min {min(values):7.1f}  max {max(values):7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Задержка /tasks/<id> с кэшем пользователей (auth.user_cache) и без него.
+
+    python -m benchmarks.bench_user_cache --seed small --iterations 500
+
+Без кэша user_loader на каждый запрос читает пользователя и роль из БД;
+с кэшем этот запрос пропадает. По умолчанию временная SQLite-база; на
+PostgreSQL по сети разница больше на время одного обращения к серверу.
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.routes import QueryCounter, measure, pick_targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", choices=["small", "medium", "large"], default="small")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    from bootstrap import bootstrap
+    bootstrap()
+    from app import app, db_session
+    from auth import user_cache
+    from database import engine
+    import seed
+
+    app.config["UPLOAD_FOLDER"] = tempfile.mkdtemp()
+    print("seed:", seed.seed(db_session(), app.config["UPLOAD_FOLDER"], **seed.PRESETS[args.seed]))
+    _, task_id = pick_targets(db_session())
+    db_session.remove()
+
+    client = app.test_client()
+    client.post("/login", data={"email": "admin@example.com", "password": "admin_password"})
+    counter = QueryCounter(engine)
+    maxsize = user_cache.maxsize
+    print(f"{'user_cache':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    # Поочерёдно, чтобы прогрев и фоновые эффекты не доставались одному варианту
+    for name, size in (("off", 0), ("on", maxsize), ("off", 0), ("on", maxsize)):
+        user_cache.maxsize = size # При нулевом размере значение вытесняется сразу после записи
+        user_cache.invalidate()
+        r = measure(client, counter, "GET", f"/tasks/{task_id}", None, args.iterations, args.warmup)
+        print(f"{name:<12} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['queries']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Записей в секунду: обычный путь (коммит на каждую запись) против групповой
+записи (writebatch.py).
+
+    python -m benchmarks.bench_writes --threads 16 --writes 2000
+    python -m benchmarks.bench_writes --max-items 50 --max-delay-ms 2
+
+Параллельные потоки добавляют комментарии и переключают задачи, как это
+делают обработчики add_comment и toggle_task. По умолчанию используется
+временная SQLite-база; DATABASE_URL можно задать явно.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.routes import patch_gevent, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--max-items", type=int, default=100)
+    parser.add_argument("--max-delay-ms", type=float, default=5)
+    parser.add_argument("--gevent", action="store_true", help="как под воркером gevent (monkey-patching)")
+    args = parser.parse_args()
+    if args.gevent:
+        patch_gevent()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    from bootstrap import bootstrap
+    bootstrap()
+    from sqlalchemy.orm import scoped_session
+    from database import SessionLocal
+    from crud import create_project, create_task, create_comment, flip_task_completed
+    import writebatch
+
+    db_session = scoped_session(SessionLocal)
+    db = db_session()
+    project = create_project(db, "bench-writes", None, None, None)
+    task_ids = [create_task(db, f"bench {i}", None, project.project_id, None, None, None, None).task_id
+                for i in range(args.tasks)]
+    db_session.remove()
+
+    def write(i):
+        task_id = task_ids[i % len(task_ids)]
+        started = time.perf_counter()
+        if i % 5 == 0:
+            writebatch.execute(db_session(), flip_task_completed, task_id)
+        else:
+            writebatch.execute(db_session(), create_comment, task_id, 1, f"benchmark comment {i}")
+        db_session.remove()
+        return (time.perf_counter() - started) * 1000
+
+    print(f"threads={args.threads} writes={args.writes} (каждая пятая — переключение задачи)")
+    print(f"{'mode':<10} {'writes/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'batches':>8}")
+    for mode in ("direct", "batched"):
+        writebatch.WRITE_BATCHING = mode == "batched"
+        writebatch.batcher = writebatch.WriteBatcher(max_items=args.max_items, max_delay=args.max_delay_ms / 1000)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            latencies = list(pool.map(write, range(args.writes)))
+        elapsed = time.perf_counter() - started
+        batches = writebatch.batcher.batches if mode == "batched" else args.writes
+        print(f"{mode:<10} {args.writes / elapsed:>10.1f} {percentile(latencies, 50):>8.2f} "
+              f"{percentile(latencies, 95):>8.2f} {batches:>8}")
+
+
+if __name__ == "__main__":
+    main()
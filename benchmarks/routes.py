@@ -0,0 +1,158 @@
+"""
+Бенчмарк основных маршрутов через Flask test client.
+
+    python -m benchmarks.routes --seed small --save benchmarks/baselines/small.json
+    python -m benchmarks.routes --seed small --compare benchmarks/baselines/small.json
+
+Для каждого маршрута: задержка p50/p95/p99, число SQL-запросов на запрос и
+пиковая память Python (tracemalloc). Без DATABASE_URL создаётся временная
+SQLite-база; --seed заполняет её синтетическими данными (см. seed.py).
+При --compare код выхода 1, если p95 или число запросов выросли больше порога.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def percentile(values, p):
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def patch_gevent():
+    """Окружение воркера gunicorn с GUNICORN_WORKER_CLASS=gevent: monkey-patching и кооперативный psycopg2."""
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def pick_targets(db):
+    """Самый большой проект и задача с самым длинным обсуждением — худшие случаи."""
+    from sqlalchemy import select, func
+    from models import Task, Comment
+    project_id = db.execute(select(Task.project_id).group_by(Task.project_id)
+                            .order_by(func.count().desc()).limit(1)).scalar()
+    task_id = db.execute(select(Comment.task_id).group_by(Comment.task_id)
+                         .order_by(func.count().desc()).limit(1)).scalar()
+    return project_id, task_id or db.execute(select(func.min(Task.task_id))).scalar()
+
+
+def measure(client, counter, method, url, data, iterations, warmup):
+    call = client.get if method == "GET" else client.post
+    for _ in range(warmup):
+        call(url, data=data)
+    latencies, queries = [], []
+    for _ in range(iterations):
+        before = counter.count
+        started = time.perf_counter()
+        response = call(url, data=data)
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count - before)
+        assert response.status_code < 400, (url, response.status_code)
+    # Память меряем отдельным проходом: tracemalloc сильно замедляет запросы
+    tracemalloc.start()
+    for _ in range(min(iterations, 5)):
+        call(url, data=data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "queries": round(statistics.mean(queries), 1),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'route':<16} {'p95 было':>10} {'p95 стало':>10} {'запросы':>14}")
+    for route, now in results.items():
+        old = baseline.get(route)
+        if not old:
+            continue
+        print(f"{route:<16} {old['p95_ms']:>10} {now['p95_ms']:>10} {old['queries']:>6} -> {now['queries']:<6}")
+        if now["p95_ms"] > old["p95_ms"] * (1 + threshold / 100) or now["queries"] > old["queries"]:
+            regressions.append(route)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", choices=["small", "medium", "large"], default=None)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--save", metavar="PATH", help="записать результаты как базовую линию")
+    parser.add_argument("--compare", metavar="PATH", help="сравнить с базовой линией")
+    parser.add_argument("--threshold", type=float, default=20.0, help="допустимый рост p95, %%")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    from bootstrap import bootstrap
+    bootstrap()
+    from app import app, db_session
+    from database import engine
+    import seed
+
+    app.config["UPLOAD_FOLDER"] = tempfile.mkdtemp()
+    if args.seed:
+        print("seed:", seed.seed(db_session(), app.config["UPLOAD_FOLDER"], **seed.PRESETS[args.seed]))
+    project_id, task_id = pick_targets(db_session())
+    db_session.remove()
+
+    client = app.test_client()
+    client.post("/login", data={"email": "admin@example.com", "password": "admin_password"})
+    counter = QueryCounter(engine)
+    routes = {
+        "dashboard": ("GET", "/", None),
+        "project_detail": ("GET", f"/projects/{project_id}", None),
+        "task_detail": ("GET", f"/tasks/{task_id}", None),
+        # Слово из словаря seed.py: совпадает с заметной долей задач и комментариев
+        "search": ("GET", "/search?q=bug", None),
+        "add_comment": ("POST", "/comments/add", {"task_id": task_id, "content": "benchmark comment"}),
+    }
+
+    results = {}
+    print(f"{'route':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'peak KiB':>10}")
+    for name, (method, url, data) in routes.items():
+        r = results[name] = measure(client, counter, method, url, data, args.iterations, args.warmup)
+        print(f"{name:<16} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['queries']:>8} {r['peak_kib']:>10}")
+
+    if args.save:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({"commit": commit, "seed": args.seed, "routes": results}, f, indent=2)
+        print(f"\nБазовая линия сохранена в {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["routes"], args.threshold)
+        if regressions:
+            print("\nРегрессии:", ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
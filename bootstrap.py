@@ -0,0 +1,188 @@
+"""
+Версионированное создание и обновление схемы БД и начальных данных.
+
+Выполняется один раз при развёртывании:
+
+    flask --app app bootstrap
+
+Воркеры при старте только сверяют версию (check_schema) одним запросом.
+При изменении моделей увеличьте SCHEMA_VERSION; если нужен не только
+DDL, но и перенос данных, добавьте шаг в MIGRATIONS.
+"""
+import os
+
+from sqlalchemy import MetaData, inspect, select, func, text
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from database import Base, engine as default_engine, SessionLocal
+from models import SchemaVersion
+import search
+
+SCHEMA_VERSION = 12
+
+def _backfill_task_events(conn):
+    """
+    Журнал событий начинается с обновления: у существующих задач история неизвестна,
+    поэтому им пишется baseline (открытым — сейчас, выполненным — в момент выполнения)
+    и completed для выполненных, включая архив.
+    """
+    for table in ("tasks", "archived_tasks"):
+        conn.execute(text(f"INSERT INTO task_events (task_id, project_id, status_id, kind, created_at) "
+                          f"SELECT task_id, project_id, status_id, 'baseline', COALESCE(completed_at, CURRENT_TIMESTAMP) "
+                          f"FROM {table}"))
+        conn.execute(text(f"INSERT INTO task_events (task_id, project_id, status_id, kind, created_at) "
+                          f"SELECT task_id, project_id, status_id, 'completed', COALESCE(completed_at, CURRENT_TIMESTAMP) "
+                          f"FROM {table} WHERE is_completed = :done"), {"done": True})
+
+def _backfill_attachment_names(conn):
+    """
+    Колонки original_name, size, sha256 и таблицу blobs добавляет sync_schema
+    (ALTER TABLE attachments ADD COLUMN ...). У старых вложений в file_path лежит
+    путь к файлу в UPLOAD_FOLDER: имя для скачивания берём из него.
+    """
+    rows = conn.execute(text("SELECT attachment_id, file_path FROM attachments "
+                             "WHERE original_name IS NULL AND sha256 IS NULL")).all()
+    if rows:
+        conn.execute(text("UPDATE attachments SET original_name = :name WHERE attachment_id = :id"),
+                     [{"id": r.attachment_id, "name": os.path.basename(r.file_path)} for r in rows])
+
+def _drop_lower_indexes(conn):
+    # Индексы поиска пользователей теперь на unicode_lower(...) (sync_schema создаёт их под новыми
+    # именами); старые были построены на переопределённом в SQLite lower()
+    for column in ("first_name", "last_name", "email"):
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_users_{column}_lower"))
+
+def _sqlite_autoincrement(conn):
+    """
+    tasks, comments и attachments в SQLite получают AUTOINCREMENT (id ушедших в архив строк не
+    достаются новым). Признак задаётся только при создании таблицы, поэтому таблица пересоздаётся
+    с переносом строк; счётчик sqlite_sequence начинается с наибольшего id, включая архив.
+    FTS-индекс ссылается на строки по id и остаётся верным, его триггеры создаются заново.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    used_ids = {"tasks": ["archived_tasks", "task_events"], "comments": ["archived_comments"],
+                "attachments": ["archived_attachments"]}
+    for name, others in used_ids.items():
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                           {"name": name}).scalar()
+        if "AUTOINCREMENT" in ddl.upper():
+            continue
+        table = Base.metadata.tables[name]
+        columns = ", ".join(c.name for c in table.columns)
+        # Копия во временной MetaData (с остальными таблицами — для внешних ключей), чтобы не трогать Base.metadata
+        copy = MetaData()
+        for other in Base.metadata.sorted_tables:
+            other.to_metadata(copy)
+        conn.execute(CreateTable(table.to_metadata(copy, name=f"_new_{name}")))
+        conn.execute(text(f"INSERT INTO _new_{name} ({columns}) SELECT {columns} FROM {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        conn.execute(text(f"ALTER TABLE _new_{name} RENAME TO {name}"))
+        for index in table.indexes:
+            index.create(bind=conn)
+        pk = table.primary_key.columns[0].name
+        last = max(conn.execute(text(f"SELECT coalesce(max({pk}), 0) FROM {t}")).scalar() for t in [name, *others])
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": name})
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": name, "seq": last})
+    search.ensure_schema(conn)
+
+def _priority_urgency(conn):
+    # Раньше срочность выводилась из priority_id; стандартным приоритетам задаём её явно
+    from crud import DEFAULT_PRIORITIES
+    conn.execute(text("UPDATE priorities SET urgency = :urgency WHERE name = :name"),
+                 [{"urgency": urgency, "name": name} for urgency, name in enumerate(DEFAULT_PRIORITIES, start=1)])
+
+
+# Дополнительные шаги миграций: версия -> список функций f(connection)
+MIGRATIONS = {
+    # Время выполнения старых задач неизвестно: отсчитываем срок до архива от обновления
+    4: [lambda conn: conn.execute(text("UPDATE tasks SET completed_at = CURRENT_TIMESTAMP "
+                                       "WHERE is_completed = :done AND completed_at IS NULL"), {"done": True})],
+    5: [_backfill_task_events],
+    8: [_backfill_attachment_names],
+    9: [_drop_lower_indexes],
+    10: [_sqlite_autoincrement],
+    12: [_priority_urgency],
+}
+
+
+def current_version(engine=default_engine):
+    """Текущая версия схемы или None, если БД ещё не инициализирована."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(SchemaVersion.version))).scalar()
+    except (OperationalError, ProgrammingError):
+        return None
+
+def check_schema(engine=default_engine):
+    return current_version(engine) == SCHEMA_VERSION
+
+
+def _column_default_sql(column, dialect):
+    default = column.server_default.arg if column.server_default is not None else None
+    if default is None and column.default is not None and column.default.is_scalar:
+        default = column.default.arg
+    if default is None:
+        return ""
+    if isinstance(default, bool):
+        return " DEFAULT " + ("TRUE" if dialect.name == "postgresql" else ("1" if default else "0"))
+    if isinstance(default, (int, float)):
+        return f" DEFAULT {default}"
+    return f" DEFAULT '{default}'" if isinstance(default, str) else ""
+
+def _index_names(conn, inspector, table_name):
+    # Индексы по выражению (unicode_lower(...)) инспектор SQLite не отражает — имена берём из sqlite_master
+    if conn.dialect.name == "sqlite":
+        return set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+                                {"table": table_name}).scalars())
+    return {i["name"] for i in inspector.get_indexes(table_name)}
+
+def sync_schema(conn):
+    """
+    Приводит схему к моделям: создаёт недостающие таблицы, колонки и индексы.
+    Колонки и индексы только добавляются — удаление делается отдельным шагом миграции.
+    """
+    Base.metadata.create_all(bind=conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            default = _column_default_sql(column, conn.dialect)
+            ddl += default
+            if not column.nullable and default:
+                ddl += " NOT NULL"
+            conn.execute(text(ddl))
+        indexes = _index_names(conn, inspector, table.name)
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(bind=conn)
+    search.ensure_schema(conn)
+
+
+def upgrade(engine=default_engine):
+    """Применяет миграции до SCHEMA_VERSION. Возвращает (старая версия, новая версия)."""
+    before = current_version(engine)
+    if before == SCHEMA_VERSION:
+        return before, before
+    with engine.begin() as conn:
+        sync_schema(conn)
+        for version in range((before or 0) + 1, SCHEMA_VERSION + 1):
+            for step in MIGRATIONS.get(version, []):
+                step(conn)
+            conn.execute(SchemaVersion.__table__.insert().values(version=version))
+    return before, SCHEMA_VERSION
+
+def bootstrap(engine=default_engine):
+    """Миграции схемы и начальные данные (роли, справочники, администратор)."""
+    from crud import create_initial_data
+    versions = upgrade(engine)
+    db = SessionLocal(bind=engine)
+    try:
+        create_initial_data(db)
+    finally:
+        db.close()
+    return versions
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш с TTL и версией.
+    Версия увеличивается при invalidate(), а у отдельного ключа — при pop():
+    значения, загруженные до сброса, не попадают в кэш (см. token, get_or_load).
+    Если задан max_bytes, размер значений (функция sizeof) ограничен суммарно.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, max_bytes: int | None = None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._data = OrderedDict() # key -> (expires_at, value, size)
+        self._generations = {} # key -> число pop() этого ключа
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def token(self, key):
+        """Снимок версий для загрузки key: передайте его в set(), чтобы не положить значение, сброшенное во время загрузки."""
+        with self._lock:
+            return self._token(key)
+
+    def _token(self, key):
+        return self.version, self._generations.get(key, 0)
+
+    def set(self, key, value, token: tuple | None = None):
+        with self._lock:
+            # Значение загружено до invalidate() или pop(key) — оно уже может быть устаревшим
+            if token is not None and token != self._token(key):
+                return
+            size = self.sizeof(value)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            if key in self._data:
+                self._remove(key)
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._data[key] = (expires_at, value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        self.bytes -= self._data.pop(key)[2]
+
+    def get_or_load(self, key, loader):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            token = self.token(key)
+            value = loader()
+            self.set(key, value, token)
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if len(self._generations) > self.maxsize:
+                # Счётчики не копятся бесконечно: новая общая версия так же отвергает все начатые загрузки
+                self.version += 1
+                self._generations.clear()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+            self._generations.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "bytes": self.bytes,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -1,14 +1,33 @@
+from sqlalchemy import select, func, update, insert, case, null, literal, and_, or_, true, tuple_
 from sqlalchemy.orm import Session, joinedload # Добавлено joinedload
-from datetime import datetime
-from models import User, Team, Project, Task, Priority, Status, Role, Comment, Attachment
-from flask_bcrypt import generate_password_hash, check_password_hash
-
-# Добавлено: Функции для работы с паролями
-def hash_password(password: str) -> str:
-    return generate_password_hash(password).decode('utf-8')
-
-def verify_password(hashed_password: str, password: str) -> bool:
-    return check_password_hash(hashed_password, password)
+from datetime import datetime, time
+from models import User, Team, Project, Task, Priority, Status, Role, Comment, Attachment, Counter, Blob, TaskEvent
+from cache import LRUCache
+from database import upsert, unicode_lower
+from storage import BLOB_GC_GRACE_SECONDS, stale_objects, remove_object, remove_stale_tmp
+from auth import invalidate_user
+import writebatch
+from passwords import hash_password, verify_password # Пароли хэшируются в пуле процессов (passwords.py)
+import os
+
+# Справочники (приоритеты, статусы, роли, команды) меняются только через create_team/create_role,
+# поэтому держим их в памяти процесса. TTL — страховка для нескольких процессов.
+REFDATA_CACHE_TTL = float(os.getenv("REFDATA_CACHE_TTL", "300"))
+refdata_cache = LRUCache(maxsize=16, ttl=REFDATA_CACHE_TTL)
+
+# Подсказки исполнителя по префиксу (search_users). Новые пользователи сбрасывают кэш,
+# состав команд (по задачам) подхватывается по TTL.
+USER_SEARCH_LIMIT = 10
+USER_SEARCH_CACHE_TTL = float(os.getenv("USER_SEARCH_CACHE_TTL", "60"))
+user_search_cache = LRUCache(maxsize=5000, ttl=USER_SEARCH_CACHE_TTL)
+
+# Число просроченных задач пользователя для значка в шапке (count_overdue_tasks).
+# Записи, меняющие исполнителя или флаг "готово", сбрасывают значение; TTL — страховка
+# для нескольких процессов и для задач, срок которых истёк без всякой записи.
+OVERDUE_CACHE_TTL = float(os.getenv("OVERDUE_CACHE_TTL", "60"))
+overdue_cache = LRUCache(maxsize=10000, ttl=OVERDUE_CACHE_TTL)
+
+DEFAULT_PRIORITIES = ("Low", "Medium", "High", "Critical") # От наименее срочного
 
 def create_initial_data(db: Session):
     # Roles
@@ -23,9 +42,9 @@ def create_initial_data(db: Session):
         db.add_all([Team(name="Core"), Team(name="Mobile")])
 
     # Priorities
-    for p in ["Low", "Medium", "High", "Critical"]:
+    for urgency, p in enumerate(DEFAULT_PRIORITIES, start=1):
         if not db.query(Priority).filter_by(name=p).first():
-            db.add(Priority(name=p))
+            db.add(Priority(name=p, urgency=urgency))
 
     # Statuses
     for s in ["Backlog", "In Progress", "In Review", "Done"]:
@@ -46,19 +65,68 @@ def create_initial_data(db: Session):
         db.add(Role(name="viewer"))
         db.commit()
 
+    refdata_cache.invalidate()
+
+    # Счётчики дашборда заполняются один раз, дальше их ведут функции записи
+    if not db.query(Counter).first():
+        rebuild_counters(db)
+
 
 # ---- Users ----
 def create_user(db: Session, first_name: str, last_name: str, email: str, password: str, role_id: int | None = None):
     hashed_password = hash_password(password)
     user = User(first_name=first_name, last_name=last_name, email=email, password=hashed_password, role_id=role_id)
     db.add(user)
+    bump_counter(db, "users")
     db.commit()
+    invalidate_user(user.user_id)
+    user_search_cache.invalidate()
     db.refresh(user)
     return user
 
+# Перехэширование при входе, если стоимость bcrypt изменилась
+def update_user_password(db: Session, user: User, password: str):
+    user.password = hash_password(password)
+    db.commit()
+    invalidate_user(user.user_id)
+    return user
+
 def get_users(db: Session):
     return db.query(User).all()
 
+def _prefix_range(column, prefix: str):
+    """unicode_lower(column) начинается с prefix — как диапазон, который читается по индексу на unicode_lower(column)."""
+    return [unicode_lower(column) >= prefix, unicode_lower(column) < prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+
+def _search_users(db: Session, prefix: str, team_id: int | None, limit: int):
+    words = prefix.split()
+    # Участники команды — исполнители задач в её проектах; отдельной таблицы членства нет
+    members = select(Task.assignee_id).join(Project, Project.project_id == Task.project_id).where(Project.team_id == team_id)
+    scopes = ([User.user_id.in_(members)] if team_id else []) + [true()]
+    found = {}
+    for scope in scopes:
+        for column in (User.first_name, User.last_name, User.email):
+            q = select(User.user_id, User.first_name, User.last_name, User.email).where(
+                *_prefix_range(column, words[0]), scope)
+            # "иван пет": остальные слова — начало имени или фамилии
+            for word in words[1:]:
+                q = q.where(or_(unicode_lower(User.first_name).startswith(word, autoescape=True),
+                                unicode_lower(User.last_name).startswith(word, autoescape=True)))
+            for row in db.execute(q.order_by(unicode_lower(column)).limit(limit)):
+                found.setdefault(row.user_id, {"user_id": row.user_id, "name": f"{row.first_name} {row.last_name}",
+                                               "email": row.email})
+            if len(found) >= limit:
+                return list(found.values())[:limit]
+    return list(found.values())
+
+# Подсказка исполнителя: первые limit пользователей, у которых имя, фамилия или email
+# начинаются с query; участники команды team_id — первыми
+def search_users(db: Session, query: str, team_id: int | None = None, limit: int = USER_SEARCH_LIMIT):
+    prefix = " ".join(query.lower().split())
+    if not prefix:
+        return []
+    return user_search_cache.get_or_load((prefix, team_id, limit), lambda: _search_users(db, prefix, team_id, limit))
+
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
@@ -70,18 +138,21 @@ def get_user_by_id(db: Session, user_id: int):
 def create_team(db: Session, name: str):
     team = Team(name=name)
     db.add(team)
+    bump_counter(db, "teams")
     db.commit()
+    refdata_cache.invalidate()
     db.refresh(team)
     return team
 
 def get_teams(db: Session):
-    return db.query(Team).all()
+    return refdata_cache.get_or_load("teams", lambda: _load_refdata(db, Team.team_id, Team.name))
 
 
 # ---- Projects ----
 def create_project(db: Session, name: str, description: str | None, team_id: int | None, due_date: datetime | None):
     project = Project(name=name, description=description, team_id=team_id, due_date=due_date)
     db.add(project)
+    bump_counter(db, "projects")
     db.commit()
     db.refresh(project)
     return project
@@ -89,9 +160,25 @@ def create_project(db: Session, name: str, description: str | None, team_id: int
 def get_projects(db: Session):
     return db.query(Project).all()
 
-# Добавлено: Получение проекта по ID с жадной загрузкой команды и задач
+# Keyset-пагинация проектов для дашборда (курсор — project_id последней строки)
+def get_projects_page(db: Session, after_id: int | None = None, limit: int = 50):
+    q = db.query(Project).options(joinedload(Project.team)).order_by(Project.project_id)
+    if after_id is not None:
+        q = q.filter(Project.project_id > after_id)
+    return q.limit(limit).all()
+
+# Только id и название — для выпадающих списков, без загрузки ORM-объектов
+def get_project_choices(db: Session):
+    return db.query(Project.project_id, Project.name).order_by(Project.name).all()
+
+# Добавлено: Получение проекта по ID с жадной загрузкой команды (задачи — get_tasks_by_project)
 def get_project_by_id(db: Session, project_id: int):
-    return db.query(Project).options(joinedload(Project.team), joinedload(Project.tasks)).get(project_id)
+    return db.query(Project).options(joinedload(Project.team)).get(project_id)
+
+# Версия страницы проекта (строка с полем version); None, если проекта нет.
+# Исполнителя форма ищет подсказками (search_users), поэтому от списка пользователей страница не зависит.
+def get_project_version(db: Session, project_id: int):
+    return db.execute(select(Project.version).where(Project.project_id == project_id)).first()
 
 def get_projects_by_team(db: Session, team_id: int):
     return db.query(Project).filter(Project.team_id == team_id).all()
@@ -102,10 +189,186 @@ def create_task(db: Session, title: str, description: str | None, project_id: in
     task = Task(title=title, description=description, project_id=project_id,
                 assignee_id=assignee_id, priority_id=priority_id, status_id=status_id, due_date=due_date)
     db.add(task)
+    db.flush() # Нужен task_id для журнала событий
+    add_task_event(db, task, "created")
+    bump_counter(db, "tasks")
+    bump_versions(db, project_ids=[project_id])
     db.commit()
+    overdue_cache.pop(assignee_id)
     db.refresh(task)
     return task
 
+# Кэши сбрасываются только после коммита, иначе параллельный запрос успеет положить в кэш
+# ещё не изменённое значение. При commit=False коммит делает writebatch — сброс откладывается до него
+def _after_commit(db: Session, commit: bool, fn):
+    if commit:
+        fn()
+    else:
+        writebatch.after_commit(db, fn)
+
+# Состояние задачи, которое возвращают UPDATE ... RETURNING ниже
+TASK_STATE = (Task.task_id, Task.project_id, Task.status_id, Task.priority_id, Task.assignee_id, Task.is_completed,
+              Task.completed_at)
+
+# Переключение флага "готово" одним UPDATE ... RETURNING: задача не читается заранее, и два
+# одновременных нажатия не теряют друг друга. Возвращает строку TASK_STATE или None.
+# commit=False — коммит делает вызывающий код (групповая запись, writebatch.py)
+def flip_task_completed(db: Session, task_id: int, commit: bool = True):
+    done = func.coalesce(Task.is_completed, False)
+    task = db.execute(update(Task.__table__).where(Task.task_id == task_id).values(
+        is_completed=~done,
+        completed_at=case((done, null()), else_=datetime.utcnow()),
+        version=Task.version + 1,
+    ).returning(*TASK_STATE)).first()
+    if not task:
+        return None
+    add_task_event(db, task, "completed" if task.is_completed else "reopened", task.completed_at)
+    bump_counter(db, "tasks_done", 1 if task.is_completed else -1)
+    bump_versions(db, project_ids=[task.project_id])
+    if commit:
+        db.commit()
+    else:
+        db.flush()
+    _after_commit(db, commit, lambda: overdue_cache.pop(task.assignee_id))
+    return task
+
+BULK_FIELDS = ("status_id", "priority_id", "assignee_id")
+
+def unknown_bulk_fields(db: Session, fields):
+    """Поля из BULK_FIELDS, чьи значения не найдены: статус и приоритет — по кэшу справочников, исполнитель — в users."""
+    known = {
+        "status_id": lambda value: value in {s.status_id for s in get_statuses(db)},
+        "priority_id": lambda value: value in {p.priority_id for p in get_priorities(db)},
+        "assignee_id": lambda value: db.execute(select(User.user_id).where(User.user_id == value)).first() is not None,
+    }
+    return [name for name, value in fields.items() if value is not None and not known[name](value)]
+
+# Массовое изменение задач без их загрузки: один UPDATE ... RETURNING для флага "готово"
+# и один для остальных полей (fields — из BULK_FIELDS). Каждый меняет только строки, где
+# значение действительно другое, поэтому счётчик и журнал событий получают точный список.
+# Возвращает (строки с переключённым флагом, строки с изменёнными полями).
+def bulk_update_tasks(db: Session, task_ids, is_completed: bool | None = None, commit: bool = True, **fields):
+    task_ids = set(task_ids)
+    toggled, changed = [], []
+    if is_completed is not None and task_ids:
+        now = datetime.utcnow()
+        toggled = db.execute(update(Task.__table__).where(
+            Task.task_id.in_(task_ids), func.coalesce(Task.is_completed, False) != is_completed
+        ).values(
+            is_completed=is_completed, completed_at=now if is_completed else None, version=Task.version + 1
+        ).returning(*TASK_STATE)).all()
+        if toggled:
+            _insert_task_events(db, toggled, "completed" if is_completed else "reopened", now)
+            bump_counter(db, "tasks_done", len(toggled) if is_completed else -len(toggled))
+    if fields and task_ids:
+        columns = Task.__table__.c
+        changed = db.execute(update(Task.__table__).where(
+            Task.task_id.in_(task_ids), or_(*[columns[name].is_distinct_from(value) for name, value in fields.items()])
+        ).values(**fields, version=Task.version + 1).returning(*TASK_STATE)).all()
+        if changed:
+            _insert_task_events(db, changed, "updated")
+    bump_versions(db, project_ids={t.project_id for t in toggled + changed})
+    if commit:
+        db.commit()
+    else:
+        db.flush()
+
+    def invalidate():
+        # Прежних исполнителей RETURNING не возвращает — при их смене сбрасываем все значки
+        if "assignee_id" in fields and changed:
+            overdue_cache.invalidate()
+        for user_id in {t.assignee_id for t in toggled}:
+            overdue_cache.pop(user_id)
+    _after_commit(db, commit, invalidate)
+    return toggled, changed
+
+# Запись в журнал событий задач (analytics.py); коммит делает вызывающая функция.
+# task — объект Task или строка TASK_STATE
+def add_task_event(db: Session, task, kind: str, at: datetime | None = None):
+    db.add(TaskEvent(task_id=task.task_id, project_id=task.project_id, status_id=task.status_id,
+                     priority_id=task.priority_id, assignee_id=task.assignee_id,
+                     kind=kind, created_at=at or datetime.utcnow()))
+
+# То же для многих строк TASK_STATE одним INSERT
+def _insert_task_events(db: Session, tasks, kind: str, at: datetime | None = None):
+    at = at or datetime.utcnow()
+    db.execute(insert(TaskEvent.__table__), [
+        {"task_id": t.task_id, "project_id": t.project_id, "status_id": t.status_id, "priority_id": t.priority_id,
+         "assignee_id": t.assignee_id, "kind": kind, "created_at": at}
+        for t in tasks])
+
+# Keyset-пагинация задач для дашборда (курсор — task_id последней строки).
+# Связанные сущности загружаются сразу, чтобы шаблон не делал 4 запроса на строку.
+def get_tasks_page(db: Session, after_id: int | None = None, limit: int = 50):
+    q = db.query(Task).options(
+        joinedload(Task.project),
+        joinedload(Task.assignee),
+        joinedload(Task.priority),
+        joinedload(Task.status)
+    ).order_by(Task.task_id)
+    if after_id is not None:
+        q = q.filter(Task.task_id > after_id)
+    return q.limit(limit).all()
+
+# "Мои задачи": открытые задачи исполнителя по сроку — просроченные первыми, при равном
+# сроке срочнее приоритет (priorities.urgency), задачи без срока в конце. Задачи со сроком и без
+# читаются двумя запросами, каждый — своим диапазоном индекса (assignee_id, is_completed, due_date),
+# без сортировки всей выборки по "due_date IS NULL". Keyset-курсор — (due_date, срочность, task_id)
+# последней строки.
+def _urgency_map(db: Session):
+    # Срочность по кэшу справочника, без JOIN с priorities; задача без приоритета — ниже всех
+    return {p.priority_id: p.urgency for p in get_priorities(db)}
+
+def _urgency(db: Session):
+    urgency = _urgency_map(db)
+    return case(urgency, value=Task.priority_id, else_=0) if urgency else literal(0)
+
+def get_my_tasks_page(db: Session, user_id: int, after: tuple | None = None, limit: int = 50):
+    urgency = _urgency(db)
+    q = db.query(Task).options(
+        joinedload(Task.project),
+        joinedload(Task.priority),
+        joinedload(Task.status)
+    ).filter(Task.assignee_id == user_id, Task.is_completed == False)
+    if after is not None:
+        due_date, after_urgency, after_id = after
+        same_due = or_(urgency < after_urgency, and_(urgency == after_urgency, Task.task_id > after_id))
+    tasks = []
+    if after is None or due_date is not None:
+        dated = q.filter(Task.due_date.isnot(None))
+        if after is not None:
+            dated = dated.filter(or_(Task.due_date > due_date, and_(Task.due_date == due_date, same_due)))
+        tasks = dated.order_by(Task.due_date, urgency.desc(), Task.task_id).limit(limit).all()
+    if len(tasks) < limit:
+        undated = q.filter(Task.due_date.is_(None))
+        if after is not None and due_date is None:
+            undated = undated.filter(same_due)
+        tasks += undated.order_by(urgency.desc(), Task.task_id).limit(limit - len(tasks)).all()
+    return tasks
+
+# Курсор в URL: "срок,срочность,task_id"; у задачи без срока первая часть пустая.
+# Срочность берётся из того же кэша справочника, по которому сортирует get_my_tasks_page
+def format_my_tasks_cursor(db: Session, task: Task):
+    urgency = _urgency_map(db).get(task.priority_id, 0)
+    return f"{task.due_date.isoformat() if task.due_date else ''},{urgency},{task.task_id}"
+
+def parse_my_tasks_cursor(value: str | None):
+    try:
+        due_date, urgency, task_id = (value or "").split(",")
+        return (datetime.fromisoformat(due_date) if due_date else None), int(urgency), int(task_id)
+    except ValueError:
+        return None
+
+# Просроченной считается задача, день срока которой прошёл (срок вводится датой)
+def overdue_before():
+    return datetime.combine(datetime.utcnow().date(), time())
+
+def count_overdue_tasks(db: Session, user_id: int):
+    return overdue_cache.get_or_load(user_id, lambda: db.execute(
+        select(func.count()).select_from(Task).where(
+            Task.assignee_id == user_id, Task.is_completed == False, Task.due_date < overdue_before())
+    ).scalar())
+
 def get_tasks_by_project(db: Session, project_id: int):
     # Добавлено: Жадная загрузка связанных сущностей для отображения в таблице задач
     return db.query(Task).filter(Task.project_id == project_id).options(
@@ -114,50 +377,182 @@ def get_tasks_by_project(db: Session, project_id: int):
         joinedload(Task.status)
     ).all()
 
-# Добавлено: Получение задачи по ID с жадной загрузкой всех связанных сущностей
+# Добавлено: Получение задачи по ID с жадной загрузкой связанных сущностей "многие к одному".
+# Коллекции в один JOIN не берём: комментарии × вложения дают произведение строк.
+# Комментарии — get_comments_page, вложения — get_attachments_for_task.
 def get_task_by_id(db: Session, task_id: int):
     return db.query(Task).options(
         joinedload(Task.project),
         joinedload(Task.assignee),
         joinedload(Task.priority),
-        joinedload(Task.status),
-        joinedload(Task.comments).joinedload(Comment.user), # Загружаем комментарии и их пользователей
-        joinedload(Task.attachments) # Загружаем вложения
+        joinedload(Task.status)
     ).get(task_id)
 
+def get_task_version(db: Session, task_id: int):
+    return db.execute(select(Task.version).where(Task.task_id == task_id)).scalar()
+
+# Версии страниц (см. fragments.py): каждая запись, меняющая страницу проекта или задачи,
+# увеличивает версию в той же транзакции; коммит делает вызывающая функция
+def bump_versions(db: Session, task_ids=(), project_ids=()):
+    if task_ids:
+        db.execute(update(Task).where(Task.task_id.in_(set(task_ids))).values(version=Task.version + 1))
+    if project_ids:
+        db.execute(update(Project).where(Project.project_id.in_(set(project_ids))).values(version=Project.version + 1))
+
+
+# ---- Stats ----
+DASHBOARD_COUNTERS = ("projects", "tasks", "users", "teams", "tasks_done")
+
+# Все счётчики дашборда одним агрегирующим запросом, без выборки самих таблиц
+def count_dashboard_stats(db: Session):
+    task_counts = select(
+        func.count().label("tasks"),
+        func.count().filter(Task.is_completed == True).label("tasks_done")
+    ).select_from(Task).subquery()
+    row = db.execute(select(
+        select(func.count()).select_from(Project).scalar_subquery().label("projects"),
+        task_counts.c.tasks,
+        select(func.count()).select_from(User).scalar_subquery().label("users"),
+        select(func.count()).select_from(Team).scalar_subquery().label("teams"),
+        task_counts.c.tasks_done
+    ).select_from(task_counts)).one()
+    return dict(row._mapping)
+
+# Чтение готовых счётчиков — O(1) независимо от размера таблиц.
+# Если таблица счётчиков ещё не заполнена, считаем агрегатом.
+def get_dashboard_stats(db: Session):
+    stats = {c.name: c.value for c in db.query(Counter).filter(Counter.name.in_(DASHBOARD_COUNTERS))}
+    if len(stats) < len(DASHBOARD_COUNTERS):
+        return count_dashboard_stats(db)
+    return stats
+
+# Увеличение счётчика атомарным UPDATE; коммит делает вызывающая функция
+def bump_counter(db: Session, name: str, delta: int = 1):
+    db.execute(update(Counter).where(Counter.name == name).values(value=Counter.value + delta))
+
+# Полный пересчёт счётчиков (команда обслуживания "flask rebuild-stats")
+def rebuild_counters(db: Session):
+    stats = count_dashboard_stats(db)
+    for name in DASHBOARD_COUNTERS:
+        counter = db.query(Counter).get(name)
+        if counter:
+            counter.value = stats[name]
+        else:
+            db.add(Counter(name=name, value=stats[name]))
+    db.commit()
+    return stats
+
 
 # ---- Roles ----
 def create_role(db: Session, name: str):
     role = Role(name=name)
     db.add(role)
     db.commit()
+    refdata_cache.invalidate()
     db.refresh(role)
     return role
 
 def get_roles(db: Session):
-    return db.query(Role).all()
+    return refdata_cache.get_or_load("roles", lambda: _load_refdata(db, Role.role_id, Role.name))
+
+def get_role_by_name(db: Session, name: str):
+    return next((r for r in get_roles(db) if r.name == name), None)
+
+
+# ---- Reference data ----
+# Строки (Row) неизменяемы и не привязаны к сессии, поэтому их можно отдавать всем потокам
+def _load_refdata(db: Session, *columns):
+    return tuple(db.execute(select(*columns).order_by(columns[0])).all())
+
+def get_priorities(db: Session):
+    return refdata_cache.get_or_load("priorities", lambda: _load_refdata(db, Priority.priority_id, Priority.name,
+                                                                          Priority.urgency))
+
+def get_statuses(db: Session):
+    return refdata_cache.get_or_load("statuses", lambda: _load_refdata(db, Status.status_id, Status.name))
 
 
 # ---- Comments ----
-def create_comment(db: Session, task_id: int, user_id: int, content: str):
+# Коммит новой строки без refresh(): если БД поддерживает INSERT ... RETURNING, id и значения
+# по умолчанию уже получены при flush. Объект отсоединяется от сессии, чтобы коммит его не сбросил.
+def _commit_new(db: Session, obj):
+    if not db.get_bind().dialect.insert_returning:
+        db.commit()
+        db.refresh(obj)
+        return
+    db.flush()
+    db.expunge(obj)
+    db.commit()
+
+def create_comment(db: Session, task_id: int, user_id: int, content: str, commit: bool = True):
     comment = Comment(task_id=task_id, user_id=user_id, content=content)
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    bump_versions(db, task_ids=[task_id])
+    if commit:
+        _commit_new(db, comment)
+    else:
+        db.flush()
     return comment
 
+# Страница комментариев от новых к старым; keyset по (created_at, comment_id),
+# before — ключ последнего показанного комментария
+def get_comments_page(db: Session, task_id: int, before: tuple | None = None, limit: int = 50):
+    q = db.query(Comment).filter(Comment.task_id == task_id).options(joinedload(Comment.user))
+    if before is not None:
+        q = q.filter(tuple_(Comment.created_at, Comment.comment_id) < tuple_(*before))
+    return q.order_by(Comment.created_at.desc(), Comment.comment_id.desc()).limit(limit).all()
+
 def get_comments_for_task(db: Session, task_id: int):
     # Добавлено: Жадная загрузка пользователя, оставившего комментарий
     return db.query(Comment).filter(Comment.task_id == task_id).options(joinedload(Comment.user)).order_by(Comment.created_at.asc()).all()
 
 
 # ---- Attachments ----
-def create_attachment(db: Session, task_id: int, file_path: str):
-    att = Attachment(task_id=task_id, file_path=file_path)
+def create_attachment(db: Session, task_id: int, file_path: str, original_name: str | None = None,
+                      size: int | None = None, sha256: str | None = None):
+    if sha256:
+        add_blob_ref(db, sha256, size)
+    att = Attachment(task_id=task_id, file_path=file_path, original_name=original_name, size=size, sha256=sha256)
     db.add(att)
+    bump_versions(db, task_ids=[task_id])
     db.commit()
     db.refresh(att)
     return att
 
+# Ссылка на объект хранилища: создаём строку или увеличиваем счётчик ссылок.
+# Одним INSERT ... ON CONFLICT — две одновременные загрузки одного файла не столкнутся на первичном ключе
+def add_blob_ref(db: Session, sha256: str, size: int, count: int = 1):
+    stmt = upsert(db, Blob.__table__).values(sha256=sha256, size=size, ref_count=count)
+    db.execute(stmt.on_conflict_do_update(index_elements=[Blob.sha256],
+                                          set_={"ref_count": Blob.ref_count + stmt.excluded.ref_count}))
+
+def gc_blobs(db: Session, root: str, grace_seconds: int = BLOB_GC_GRACE_SECONDS, batch_size: int = 500):
+    """
+    Удаляет файлы хранилища, на которые нет ссылок в blobs и которые не менялись
+    дольше grace_seconds, а также брошенные временные файлы. Возвращает число удалённых.
+    """
+    older_than = datetime.now().timestamp() - grace_seconds
+    removed = remove_stale_tmp(root, older_than)
+    candidates = list(stale_objects(root, older_than))
+    for i in range(0, len(candidates), batch_size):
+        chunk = candidates[i:i + batch_size]
+        referenced = set(db.execute(select(Blob.sha256).where(Blob.sha256.in_(chunk), Blob.ref_count > 0)).scalars())
+        removed += sum(remove_object(root, sha256, older_than) for sha256 in chunk if sha256 not in referenced)
+    return removed
+
+def get_attachment_by_id(db: Session, attachment_id: int):
+    return db.query(Attachment).get(attachment_id)
+
 def get_attachments_for_task(db: Session, task_id: int):
-    return db.query(Attachment).filter(Attachment.task_id == task_id).all()
\ No newline at end of file
+    return db.query(Attachment).filter(Attachment.task_id == task_id).order_by(Attachment.attachment_id).all()
+
+# ---- Sparse selects (JSON API) ----
+# Только запрошенные колонки, без ORM-объектов; keyset-пагинация по первичному ключу
+def get_rows_page(db: Session, pk, columns, criteria=(), after_id: int | None = None, limit: int = 100):
+    q = select(*columns).where(*criteria).order_by(pk).limit(limit)
+    if after_id is not None:
+        q = q.where(pk > after_id)
+    return db.execute(q).all()
+
+def get_rows_by_ids(db: Session, pk, columns, ids):
+    return db.execute(select(*columns).where(pk.in_(ids)).order_by(pk)).all()
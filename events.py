@@ -0,0 +1,149 @@
+"""
+Живые обновления страниц через Server-Sent Events.
+
+Внутрипроцессный брокер: обработчики после коммита публикуют событие в канал
+("project:1", "task:5"), открытые страницы получают его по SSE и меняют только
+изменившийся элемент (static/live.js) вместо перезагрузки.
+
+У каждого клиента своя очередь на SSE_QUEUE_SIZE событий: клиент, который не
+успевает читать, отключается и получает "reset" (страница перезагрузится).
+Последние события канала хранятся, чтобы клиент, переподключившийся
+с заголовком Last-Event-ID, получил пропущенное.
+
+Брокер живёт в процессе: при нескольких воркерах событие получают клиенты
+того же воркера. По умолчанию воркер gthread, и каждое соединение занимает поток;
+для тысяч простаивающих соединений — GUNICORN_WORKER_CLASS=gevent (см. gunicorn.conf.py).
+"""
+import json
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict, deque
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15")) # Секунды; заодно так замечаем отключившихся клиентов
+SSE_MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", "5000"))
+SSE_HISTORY = 50 # Событий на канал для переподключения
+SSE_MAX_CHANNELS = 10000 # Каналы без подписчиков вытесняются по LRU
+
+RESET = "event: reset\ndata: {}\n\n"
+
+
+class BrokerFull(Exception):
+    """Достигнут лимит SSE_MAX_CLIENTS соединений на воркер."""
+
+
+class Subscription:
+    __slots__ = ("channel", "queue", "backlog", "dropped", "closed")
+
+    def __init__(self, channel, size):
+        self.channel = channel
+        self.queue = queue.Queue(size)
+        self.backlog = []
+        self.dropped = False
+        self.closed = False
+
+
+class _Channel:
+    # epoch отличает каналы, созданные заново после вытеснения или перезапуска
+    __slots__ = ("epoch", "seq", "history", "subscribers")
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.history = deque(maxlen=SSE_HISTORY) # (seq, сообщение)
+        self.subscribers = set()
+
+
+class Broker:
+    def __init__(self, queue_size=SSE_QUEUE_SIZE, max_clients=SSE_MAX_CLIENTS):
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.clients = 0
+        self.published = 0
+        self.dropped = 0
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _channel(self, name):
+        channel = self._channels.get(name)
+        if channel is None:
+            channel = self._channels[name] = _Channel()
+            if len(self._channels) > SSE_MAX_CHANNELS:
+                idle = next((n for n, c in self._channels.items() if not c.subscribers), None)
+                if idle is not None:
+                    del self._channels[idle]
+        self._channels.move_to_end(name)
+        return channel
+
+    def publish(self, name, event, data):
+        """Отправляет событие всем подписчикам канала; не блокируется на медленных клиентах."""
+        with self._lock:
+            channel = self._channel(name)
+            channel.seq += 1
+            message = f"id: {channel.epoch}-{channel.seq}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            channel.history.append((channel.seq, message))
+            self.published += 1
+            for sub in list(channel.subscribers):
+                try:
+                    sub.queue.put_nowait(message)
+                except queue.Full:
+                    # Клиент не успевает — отключаем, иначе очередь растёт без предела
+                    sub.dropped = True
+                    channel.subscribers.discard(sub)
+                    self.dropped += 1
+
+    def subscribe(self, name, last_event_id=None):
+        """
+        Подписка на канал. Если передан Last-Event-ID, в backlog попадают пропущенные
+        события, а если их уже нет в истории — "reset".
+        """
+        with self._lock:
+            if self.clients >= self.max_clients:
+                raise BrokerFull()
+            channel = self._channel(name)
+            sub = Subscription(name, self.queue_size)
+            if last_event_id:
+                epoch, _, seq = last_event_id.partition("-")
+                seq = int(seq) if seq.isdigit() else -1
+                missed = [m for s, m in channel.history if s > seq]
+                complete = channel.history[0][0] <= seq + 1 if channel.history else channel.seq == seq
+                sub.backlog = missed if epoch == channel.epoch and 0 <= seq <= channel.seq and complete else [RESET]
+            channel.subscribers.add(sub)
+            self.clients += 1
+            return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub.closed:
+                return
+            sub.closed = True
+            channel = self._channels.get(sub.channel)
+            if channel is not None:
+                channel.subscribers.discard(sub)
+            self.clients -= 1
+
+    def stream(self, sub, heartbeat=SSE_HEARTBEAT):
+        """
+        Генератор тела text/event-stream. Отписку делает вызывающий код при закрытии
+        ответа (response.call_on_close): закрытие генератора, который ещё не начал
+        работу, не выполняет его finally.
+        """
+        yield "retry: 3000\n\n"
+        for message in sub.backlog:
+            yield message
+        while not sub.dropped:
+            try:
+                yield sub.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": ping\n\n"
+        yield RESET
+
+    def stats(self):
+        with self._lock:
+            return {"clients": self.clients, "channels": len(self._channels),
+                    "published": self.published, "dropped": self.dropped}
+
+
+broker = Broker()
@@ -0,0 +1,110 @@
+"""
+Потоковая выгрузка задач проекта в CSV / NDJSON.
+
+Задачи читаются серверным курсором (stream_results + yield_per) частями
+по EXPORT_CHUNK строк; комментарии и вложения подгружаются отдельным
+запросом на каждую часть. Память воркера не зависит от размера проекта.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import User, Task, Priority, Status, Comment, Attachment
+
+EXPORT_CHUNK = 1000
+
+TASK_FIELDS = ("task_id", "title", "description", "assignee", "priority", "status", "due_date", "is_completed")
+
+
+def _tasks_query(project_id: int):
+    return (
+        select(Task.task_id, Task.title, Task.description, User.email.label("assignee"),
+               Priority.name.label("priority"), Status.name.label("status"), Task.due_date, Task.is_completed)
+        .outerjoin(User, Task.assignee_id == User.user_id)
+        .outerjoin(Priority, Task.priority_id == Priority.priority_id)
+        .outerjoin(Status, Task.status_id == Status.status_id)
+        .where(Task.project_id == project_id)
+        .order_by(Task.task_id)
+        .execution_options(stream_results=True, yield_per=EXPORT_CHUNK)
+    )
+
+def _group_by_task(db: Session, query):
+    grouped = {}
+    for row in db.execute(query):
+        item = dict(row._mapping)
+        grouped.setdefault(item.pop("task_id"), []).append(item)
+    return grouped
+
+def _comments_for(db: Session, task_ids):
+    return _group_by_task(db, select(Comment.task_id, User.email.label("user"), Comment.content, Comment.created_at)
+                          .join(User, Comment.user_id == User.user_id)
+                          .where(Comment.task_id.in_(task_ids))
+                          .order_by(Comment.task_id, Comment.created_at))
+
+# Путь к файлу на сервере (file_path) не выгружается, как и в API; вместо него — ссылка на скачивание
+def _attachments_for(db: Session, task_ids, attachment_url=None):
+    grouped = _group_by_task(db, select(Attachment.task_id, Attachment.attachment_id, Attachment.original_name,
+                                        Attachment.size, Attachment.sha256, Attachment.uploaded_at)
+                             .where(Attachment.task_id.in_(task_ids))
+                             .order_by(Attachment.task_id, Attachment.attachment_id))
+    if attachment_url is not None:
+        for items in grouped.values():
+            for item in items:
+                item["url"] = attachment_url(item["attachment_id"])
+    return grouped
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def iter_task_chunks(db: Session, project_id: int, with_comments: bool = False, with_attachments: bool = False,
+                     attachment_url=None):
+    """Отдаёт списки словарей-задач частями по EXPORT_CHUNK; attachment_url(attachment_id) — ссылка на файл."""
+    result = db.execute(_tasks_query(project_id))
+    try:
+        for partition in result.partitions():
+            tasks = [dict(row._mapping) for row in partition]
+            ids = [t["task_id"] for t in tasks]
+            comments = _comments_for(db, ids) if with_comments else None
+            attachments = _attachments_for(db, ids, attachment_url) if with_attachments else None
+            for t in tasks:
+                if comments is not None:
+                    t["comments"] = comments.get(t["task_id"], [])
+                if attachments is not None:
+                    t["attachments"] = attachments.get(t["task_id"], [])
+            yield tasks
+    finally:
+        result.close()
+
+
+def stream_ndjson(chunks):
+    for tasks in chunks:
+        yield "".join(json.dumps(t, ensure_ascii=False, default=_json_default) + "\n" for t in tasks)
+
+# В CSV вложенные списки (комментарии, вложения) пишутся в колонку как JSON
+def stream_csv(chunks, with_comments: bool = False, with_attachments: bool = False):
+    fields = list(TASK_FIELDS)
+    if with_comments:
+        fields.append("comments")
+    if with_attachments:
+        fields.append("attachments")
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    writer.writeheader()
+    for tasks in chunks:
+        for t in tasks:
+            for key in ("comments", "attachments"):
+                if key in t:
+                    t[key] = json.dumps(t[key], ensure_ascii=False, default=_json_default)
+            writer.writerow(t)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
@@ -0,0 +1,68 @@
+"""
+Кэш отрендеренных фрагментов страниц и условные ответы (ETag / 304).
+
+У проектов и задач есть версия (Project.version, Task.version), которую
+увеличивает каждая запись, меняющая их страницу (crud.bump_versions).
+Версия входит в ключ фрагмента и в ETag страницы, поэтому явная
+инвалидация не нужна: после записи просто появляется новый ключ, а старые
+фрагменты вытесняются по LRU. Размер кэша ограничен FRAGMENT_CACHE_MAX_BYTES.
+"""
+import hashlib
+import os
+import sys
+
+from flask import Response, render_template, request, session
+from markupsafe import Markup
+
+from cache import LRUCache
+
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "5000"))
+FRAGMENT_CACHE_MAX_BYTES = int(os.getenv("FRAGMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+fragment_cache = LRUCache(maxsize=FRAGMENT_CACHE_SIZE, max_bytes=FRAGMENT_CACHE_MAX_BYTES, sizeof=sys.getsizeof)
+
+
+def _templates_digest():
+    # После выкладки новых шаблонов старые ETag и фрагменты не должны совпасть с новыми
+    digest = hashlib.sha1()
+    root = os.path.join(os.path.dirname(__file__), "templates")
+    for name in sorted(os.listdir(root)):
+        with open(os.path.join(root, name), "rb") as f:
+            digest.update(name.encode() + f.read())
+    return digest.hexdigest()[:8]
+
+TEMPLATES_DIGEST = _templates_digest()
+
+
+def render_fragment(key, template, load):
+    """HTML фрагмента из кэша; при промахе шаблон рендерится с данными load()."""
+    html = fragment_cache.get_or_load((TEMPLATES_DIGEST,) + key, lambda: render_template(template, **load()))
+    return Markup(html)
+
+
+def page_etag(*parts):
+    """
+    Слабый ETag страницы: версии данных и пользователь (навбар у каждого свой).
+    None, если в сессии ждут flash-сообщения — такую страницу нельзя отдавать из кэша браузера.
+    """
+    if session.get("_flashes"):
+        return None
+    user_id = session.get("_user_id")
+    return "-".join(str(p) for p in (*parts, f"u{user_id}", TEMPLATES_DIGEST))
+
+def not_modified(etag):
+    """Ответ 304, если у браузера уже есть эта версия страницы, иначе None."""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        set_page_etag(response, etag)
+        return response
+    return None
+
+def set_page_etag(response, etag):
+    if etag:
+        response.set_etag(etag, weak=True)
+    # Браузер хранит страницу, но каждый раз переспрашивает сервер
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
@@ -0,0 +1,47 @@
+"""
+Настройки gunicorn для развёртывания:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+По умолчанию воркер gthread: GUNICORN_THREADS потоков на процесс, каждый
+открытый SSE-поток (events.py) занимает один из них.
+
+Для тысяч простаивающих SSE-соединений — асинхронный воркер:
+
+    GUNICORN_WORKER_CLASS=gevent gunicorn -c gunicorn.conf.py app:app
+
+Тогда драйвер PostgreSQL переводится на кооперативный режим (psycogreen),
+иначе каждый запрос к БД останавливал бы все гринлеты воркера. Запросы к
+SQLite так не переключаются — gevent имеет смысл только с PostgreSQL.
+Замеры с monkey-patching gevent, как в воркере (benchmarks/bench_login.py
+и bench_writes.py с флагом --gevent; SQLite, 1 CPU, 1 процесс bcrypt):
+
+    PASSWORD_QUEUE_LIMIT=8 bench_login --rounds 10 --threads 8 --requests 64
+        потоки 8.0 входов/с, gevent 7.5, без 503 — bcrypt в пуле процессов не держит хаб
+    bench_writes --threads 16 --writes 2000         записей/с   p95 мс
+        коммит на запись, потоки                      215        340
+        коммит на запись, gevent                      206          7
+        групповая запись, потоки                      380         51
+        групповая запись, gevent                      327         66
+
+Под gevent вызовы SQLite выполняются по одному и блокируют хаб: пропускная
+способность записи ниже, но без конкуренции потоков за блокировку БД.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+if worker_class == "gevent":
+    # Соединений на воркер, включая SSE; держите не меньше SSE_MAX_CLIENTS
+    worker_connections = int(os.getenv("WORKER_CONNECTIONS", os.getenv("SSE_MAX_CLIENTS", "5000")))
+timeout = int(os.getenv("WORKER_TIMEOUT", "30"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
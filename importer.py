@@ -0,0 +1,276 @@
+"""
+Потоковый импорт задач и комментариев из CSV / NDJSON.
+
+Файл читается построчно, имена (проект, исполнитель, приоритет, статус)
+превращаются в id через словари в памяти, строки вставляются пачками
+(executemany, на PostgreSQL — COPY) с одним коммитом на пачку.
+Ошибочные строки попадают в отчёт и не прерывают импорт.
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import select, insert, func, case, literal, exists, and_
+from sqlalchemy.orm import Session
+
+from models import User, Project, Task, Priority, Status, Comment, TaskEvent
+from crud import bump_counter, bump_versions, overdue_cache
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+TASK_COLUMNS = ("title", "description", "project_id", "assignee_id", "priority_id", "status_id", "due_date", "is_completed",
+                "completed_at")
+COMMENT_COLUMNS = ("task_id", "user_id", "content", "created_at")
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows_ok = 0
+        self.rows_failed = 0
+        self.errors = [] # (номер строки, сообщение)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def error(self, line_no: int, message: str):
+        self.rows_failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_no, message))
+
+    @property
+    def rows_per_sec(self):
+        return self.rows_ok / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return f"импортировано {self.rows_ok}, ошибок {self.rows_failed}, {self.rows_per_sec:.0f} строк/с"
+
+
+def detect_format(filename: str) -> str:
+    return "ndjson" if filename.lower().endswith((".ndjson", ".jsonl", ".json")) else "csv"
+
+# Генератор (номер строки, сырая запись) — файл целиком в память не читается.
+# Строку NDJSON разбирает _parse_record внутри обработки строки: ошибка одной строки не прерывает импорт
+def iter_records(stream, fmt: str):
+    if fmt == "ndjson":
+        for line_no, line in enumerate(stream, start=1):
+            if line.strip():
+                yield line_no, line
+    else:
+        for line_no, row in enumerate(csv.DictReader(stream), start=2): # строка 1 — заголовок
+            yield line_no, row
+
+def _check_utf8(value):
+    # Поток открыт с errors="surrogateescape": байты не из UTF-8 доходят до строки, а не роняют чтение файла
+    if isinstance(value, str):
+        try:
+            value.encode("utf-8")
+        except UnicodeEncodeError:
+            raise ValueError("строка не в кодировке UTF-8") from None
+
+def _parse_record(raw):
+    if isinstance(raw, dict):
+        for value in raw.values():
+            _check_utf8(value)
+        return raw
+    _check_utf8(raw)
+    try:
+        record = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"неверный JSON: {e.msg}") from None
+    if not isinstance(record, dict):
+        raise ValueError("строка NDJSON должна быть объектом")
+    return record
+
+
+def _text(value):
+    value = value.strip() if isinstance(value, str) else value
+    return value if value not in ("", None) else None
+
+def _int(value):
+    value = _text(value)
+    return int(value) if value is not None else None
+
+def _date(value):
+    value = _text(value)
+    return datetime.fromisoformat(value) if value is not None else None
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in ("1", "true", "yes", "да", "done")
+
+# Поле может прийти как id ("project_id") или как имя ("project") — имя ищем в словаре
+def _resolve(record, id_field, name_field, lookup, what):
+    if _text(record.get(id_field)) is not None:
+        return _int(record[id_field])
+    name = _text(record.get(name_field))
+    if name is None:
+        return None
+    if name not in lookup:
+        raise ValueError(f"неизвестный {what}: {name}")
+    return lookup[name]
+
+
+def _name_map(db: Session, key_column, id_column):
+    return {key: id_ for key, id_ in db.execute(select(key_column, id_column))}
+
+def _copy_rows(db: Session, table, columns, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([_copy_value(row[c]) for c in columns])
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+def _copy_value(value):
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _insert_batch(db: Session, model, columns, rows, use_copy):
+    if use_copy:
+        _copy_rows(db, model.__table__, columns, rows)
+    else:
+        db.execute(insert(model.__table__), rows) # executemany
+
+
+def _flush(db: Session, model, columns, batch, report, before_insert, after_insert, use_copy):
+    """Вставляет пачку одним коммитом; если БД отвергла пачку, ищет виноватые строки по одной."""
+    if not batch:
+        return
+    rows = [row for _, row in batch]
+    try:
+        before_insert()
+        _insert_batch(db, model, columns, rows, use_copy)
+        after_insert(rows)
+        db.commit()
+        report.rows_ok += len(rows)
+        return
+    except Exception:
+        db.rollback()
+    for line_no, row in batch:
+        try:
+            before_insert()
+            _insert_batch(db, model, columns, [row], False)
+            after_insert([row])
+            db.commit()
+            report.rows_ok += 1
+        except Exception as e:
+            db.rollback()
+            report.error(line_no, str(getattr(e, "orig", e)).splitlines()[0])
+
+
+def _run_import(db: Session, records, model, columns, build_row, after_insert, report, batch_size,
+                before_insert=lambda: None):
+    use_copy = db.get_bind().dialect.name == "postgresql"
+    batch = []
+    for line_no, record in records:
+        try:
+            batch.append((line_no, build_row(_parse_record(record))))
+        except (ValueError, TypeError, KeyError) as e:
+            report.error(line_no, str(e))
+            continue
+        if len(batch) >= batch_size:
+            _flush(db, model, columns, batch, report, before_insert, after_insert, use_copy)
+            batch = []
+    _flush(db, model, columns, batch, report, before_insert, after_insert, use_copy)
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+
+def _has_event(*criteria):
+    return exists().where(TaskEvent.task_id == Task.task_id, *criteria)
+
+def _log_task_events(db: Session, after_id: int):
+    """
+    События для задач пачки: id вставленных строк COPY не возвращает, поэтому берём
+    задачи с task_id > after_id без событий — у задач, созданных параллельно через
+    crud, событие коммитится вместе с задачей. Время создания выполненной задачи
+    неизвестно: ей пишется baseline, а не created, в статистику времени цикла она не попадает.
+    """
+    now = datetime.utcnow()
+    columns = ["task_id", "project_id", "status_id", "priority_id", "assignee_id", "kind", "created_at"]
+    done = Task.is_completed == True
+    new = and_(Task.task_id > after_id, ~_has_event())
+    db.execute(insert(TaskEvent.__table__).from_select(columns, select(
+        Task.task_id, Task.project_id, Task.status_id, Task.priority_id, Task.assignee_id,
+        case((done, literal("baseline")), else_=literal("created")),
+        case((done, func.coalesce(Task.completed_at, now)), else_=literal(now))).where(new)))
+    # Теперь у задач пачки есть baseline; ещё нет только события выполнения
+    db.execute(insert(TaskEvent.__table__).from_select(columns, select(
+        Task.task_id, Task.project_id, Task.status_id, Task.priority_id, Task.assignee_id, literal("completed"), func.coalesce(Task.completed_at, now))
+        .where(Task.task_id > after_id, done, _has_event(TaskEvent.kind == "baseline"),
+               ~_has_event(TaskEvent.kind == "completed"))))
+
+
+def import_tasks(db: Session, stream, fmt: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE):
+    projects = _name_map(db, Project.name, Project.project_id)
+    users = _name_map(db, User.email, User.user_id)
+    priorities = _name_map(db, Priority.name, Priority.priority_id)
+    statuses = _name_map(db, Status.name, Status.status_id)
+
+    def build_row(record):
+        title = _text(record.get("title"))
+        if title is None:
+            raise ValueError("не указано название задачи")
+        project_id = _resolve(record, "project_id", "project", projects, "проект")
+        if project_id is None:
+            raise ValueError("не указан проект")
+        completed = _bool(record.get("is_completed"))
+        return {
+            "title": title,
+            "description": _text(record.get("description")),
+            "project_id": project_id,
+            "assignee_id": _resolve(record, "assignee_id", "assignee", users, "исполнитель"),
+            "priority_id": _resolve(record, "priority_id", "priority", priorities, "приоритет"),
+            "status_id": _resolve(record, "status_id", "status", statuses, "статус"),
+            "due_date": _date(record.get("due_date")),
+            "is_completed": completed,
+            "completed_at": (_date(record.get("completed_at")) or datetime.utcnow()) if completed else None,
+        }
+
+    last_id = {}
+    def before_insert():
+        last_id["value"] = db.execute(select(func.coalesce(func.max(Task.task_id), 0))).scalar()
+
+    def after_insert(rows):
+        _log_task_events(db, last_id["value"])
+        bump_counter(db, "tasks", len(rows))
+        bump_counter(db, "tasks_done", sum(1 for r in rows if r["is_completed"]))
+        bump_versions(db, project_ids=[r["project_id"] for r in rows])
+
+    report = _run_import(db, iter_records(stream, fmt), Task, TASK_COLUMNS, build_row, after_insert,
+                         ImportReport(), batch_size, before_insert)
+    overdue_cache.invalidate() # Значки просроченных задач у исполнителей импортированных задач
+    return report
+
+
+def import_comments(db: Session, stream, fmt: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE):
+    users = _name_map(db, User.email, User.user_id)
+
+    def build_row(record):
+        task_id = _int(record.get("task_id"))
+        user_id = _resolve(record, "user_id", "user", users, "пользователь")
+        content = _text(record.get("content"))
+        if task_id is None or user_id is None or content is None:
+            raise ValueError("нужны task_id, пользователь и текст комментария")
+        return {
+            "task_id": task_id,
+            "user_id": user_id,
+            "content": content,
+            "created_at": _date(record.get("created_at")) or datetime.utcnow(),
+        }
+
+    def after_insert(rows):
+        bump_versions(db, task_ids=[r["task_id"] for r in rows])
+
+    return _run_import(db, iter_records(stream, fmt), Comment, COMMENT_COLUMNS, build_row, after_insert,
+                       ImportReport(), batch_size)
+
+
+IMPORTERS = {"tasks": import_tasks, "comments": import_comments}
@@ -0,0 +1,190 @@
+"""
+SQL-инструментирование запросов и метрики в формате Prometheus.
+
+Хуки движка SQLAlchemy считают для каждого HTTP-запроса число SQL-запросов,
+суммарное время в БД и самый медленный запрос. Если одна и та же форма
+запроса повторилась больше NPLUSONE_THRESHOLD раз, запрос помечается как
+подозрение на N+1. Гистограммы по эндпоинтам отдаются на /metrics,
+при SERVER_TIMING=1 — ещё и в заголовке Server-Timing.
+"""
+import hmac
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import Response, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", "10"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+# /metrics отдаётся по "Authorization: Bearer <METRICS_TOKEN>" или вошедшему пользователю;
+# без входа и токена — только в режиме отладки
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "slowest_time", "slowest_statement", "shapes")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.shapes = Counter()
+
+    def suspected_n_plus_one(self):
+        shape, count = self.shapes.most_common(1)[0] if self.shapes else (None, 0)
+        return (shape, count) if count > NPLUSONE_THRESHOLD else (None, 0)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+_metrics_lock = threading.Lock()
+_histograms = {} # (имя метрики, endpoint) -> Histogram
+_counters = Counter() # (имя метрики, endpoint) -> значение
+
+_WS = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+
+# Форма запроса: без литералов и с одинаковыми IN-списками любой длины
+def statement_shape(statement: str) -> str:
+    shape = _WS.sub(" ", statement).strip()
+    shape = _IN_LIST.sub("(?)", shape)
+    return _NUMBER.sub("?", shape)
+
+
+# Время старта храним на контексте выполнения: у упавшего запроса он просто
+# отбрасывается, ничего не копится на соединении
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None or not has_request_context():
+        return
+    stats = g.get("sql_stats")
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.queries += 1
+    stats.db_time += elapsed
+    stats.shapes[statement_shape(statement)] += 1
+    if elapsed > stats.slowest_time:
+        stats.slowest_time = elapsed
+        stats.slowest_statement = statement
+
+
+def _start_request():
+    g.sql_stats = RequestStats()
+    g.request_started = time.perf_counter()
+
+def _observe(name, endpoint, buckets, value):
+    key = (name, endpoint)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram(buckets)
+    histogram.observe(value)
+
+def _finish_request(app, response):
+    stats = g.pop("sql_stats", None)
+    if stats is None:
+        return response
+    duration = time.perf_counter() - g.pop("request_started")
+    endpoint = request.endpoint or "unknown"
+    shape, repeats = stats.suspected_n_plus_one()
+    with _metrics_lock:
+        _observe("http_request_duration_seconds", endpoint, DURATION_BUCKETS, duration)
+        _observe("sql_time_seconds", endpoint, DURATION_BUCKETS, stats.db_time)
+        _observe("sql_queries_per_request", endpoint, QUERY_BUCKETS, stats.queries)
+        if shape:
+            _counters[("sql_n_plus_one_suspected_total", endpoint)] += 1
+    if shape:
+        app.logger.warning("Подозрение на N+1 в %s: %d повторов запроса %s", endpoint, repeats, shape[:200])
+    if stats.slowest_statement and stats.slowest_time > 0.5:
+        app.logger.warning("Медленный SQL в %s (%.0f мс): %s", endpoint, stats.slowest_time * 1000,
+                           statement_shape(stats.slowest_statement)[:200])
+    if SERVER_TIMING:
+        timing = [f'app;dur={duration * 1000:.1f}', f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"']
+        if stats.slowest_statement:
+            timing.append(f"db-slowest;dur={stats.slowest_time * 1000:.1f}")
+        if shape:
+            timing.append(f'n-plus-one;desc="{repeats}x"')
+        response.headers.add("Server-Timing", ", ".join(timing))
+    return response
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+def render_metrics(caches=None):
+    lines = []
+    with _metrics_lock:
+        by_name = {}
+        for (name, endpoint), histogram in sorted(_histograms.items()):
+            by_name.setdefault(name, []).append((endpoint, histogram))
+        for name, series in by_name.items():
+            lines.append(f"# TYPE {name} histogram")
+            for endpoint, h in series:
+                labels = f'endpoint="{_label(endpoint)}"'
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+        if _counters:
+            lines.append("# TYPE sql_n_plus_one_suspected_total counter")
+            for (name, endpoint), value in sorted(_counters.items()):
+                lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {value}')
+    if caches:
+        lines.append("# TYPE cache_hits_total counter")
+        lines.extend(f'cache_hits_total{{cache="{name}"}} {c.stats()["hits"]}' for name, c in caches.items())
+        lines.append("# TYPE cache_misses_total counter")
+        lines.extend(f'cache_misses_total{{cache="{name}"}} {c.stats()["misses"]}' for name, c in caches.items())
+        lines.append("# TYPE cache_entries gauge")
+        lines.extend(f'cache_entries{{cache="{name}"}} {c.stats()["size"]}' for name, c in caches.items())
+        lines.append("# TYPE cache_bytes gauge")
+        lines.extend(f'cache_bytes{{cache="{name}"}} {c.stats()["bytes"]}' for name, c in caches.items())
+    return "\n".join(lines) + "\n"
+
+
+def install_engine(engine):
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def install(app, engine, caches=None):
+    """Подключает хуки к движку и приложению и регистрирует /metrics."""
+    install_engine(engine)
+    app.before_request(_start_request)
+    app.after_request(lambda response: _finish_request(app, response))
+
+    def metrics():
+        token_ok = METRICS_TOKEN and hmac.compare_digest(request.headers.get("Authorization", ""),
+                                                         f"Bearer {METRICS_TOKEN}")
+        if not (token_ok or app.debug or current_user.is_authenticated):
+            return Response("Unauthorized\n", status=401)
+        return Response(render_metrics(caches), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics)
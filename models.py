@@ -1,7 +1,7 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, DateTime, ForeignKey, Text, Index, false
 from sqlalchemy.orm import relationship
-from database import Base
+from database import Base, unicode_lower
 from flask_login import UserMixin # Добавлено
 
 class Role(Base):
@@ -30,6 +30,13 @@ class User(Base, UserMixin): # Изменено
     tasks = relationship("Task", back_populates="assignee")
     comments = relationship("Comment", back_populates="user")
 
+    # Поиск исполнителя по префиксу (crud.search_users)
+    __table_args__ = (
+        Index("ix_users_first_name_search", unicode_lower(first_name)),
+        Index("ix_users_last_name_search", unicode_lower(last_name)),
+        Index("ix_users_email_search", unicode_lower(email)),
+    )
+
     # Методы, требуемые Flask-Login
     def get_id(self):
         return str(self.user_id) # Flask-Login требует строковое представление ID
@@ -51,6 +58,7 @@ class Project(Base):
     description = Column(Text, nullable=True)
     team_id = Column(Integer, ForeignKey("teams.team_id"), nullable=True)
     due_date = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1") # Увеличивается при каждом изменении страницы проекта (fragments.py)
 
     team = relationship("Team", back_populates="projects")
     tasks = relationship("Task", back_populates="project")
@@ -59,6 +67,7 @@ class Priority(Base):
     __tablename__ = "priorities"
     priority_id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
+    urgency = Column(Integer, nullable=False, default=0, server_default="0") # Больше — срочнее; порядок в "Моих задачах"
     tasks = relationship("Task", back_populates="priority")
 
 class Status(Base):
@@ -72,12 +81,14 @@ class Task(Base):
     task_id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
-    project_id = Column(Integer, ForeignKey("projects.project_id"), nullable=False)
-    assignee_id = Column(Integer, ForeignKey("users.user_id"), nullable=True)
+    project_id = Column(Integer, ForeignKey("projects.project_id"), nullable=False, index=True)
+    assignee_id = Column(Integer, ForeignKey("users.user_id"), nullable=True) # Индекс — составной, см. __table_args__
     priority_id = Column(Integer, ForeignKey("priorities.priority_id"), nullable=True)
-    status_id = Column(Integer, ForeignKey("statuses.status_id"), nullable=True)
+    status_id = Column(Integer, ForeignKey("statuses.status_id"), nullable=True, index=True)
     due_date = Column(DateTime, nullable=True)
     is_completed = Column(Boolean, default=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1") # Увеличивается при каждом изменении страницы задачи (fragments.py)
+    completed_at = Column(DateTime, nullable=True) # Когда задачу отметили выполненной; по нему задачи уходят в архив
 
     project = relationship("Project", back_populates="tasks")
     assignee = relationship("User", back_populates="tasks")
@@ -86,6 +97,17 @@ class Task(Base):
     comments = relationship("Comment", back_populates="task", cascade="all, delete-orphan")
     attachments = relationship("Attachment", back_populates="task", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Выборка кандидатов в архив (archive.py)
+        Index("ix_tasks_is_completed_completed_at", "is_completed", "completed_at"),
+        # "Мои задачи" и значок просроченных (crud.get_my_tasks_page, count_overdue_tasks);
+        # по первой колонке он же служит индексом на assignee_id
+        Index("ix_tasks_assignee_id_is_completed_due_date", "assignee_id", "is_completed", "due_date"),
+        # id не переиспользуются после удаления (в SQLite без AUTOINCREMENT новая строка получает
+        # max(id) + 1): задача, ушедшая в архив, вернётся под своим id. Так же у комментариев и вложений
+        {"sqlite_autoincrement": True},
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
     comment_id = Column(Integer, primary_key=True, index=True)
@@ -97,11 +119,110 @@ class Comment(Base):
     task = relationship("Task", back_populates="comments")
     user = relationship("User", back_populates="comments")
 
+    # Страница комментариев задачи (новые сверху) читается по индексу, без сортировки
+    __table_args__ = (Index("ix_comments_task_id_created_at", "task_id", "created_at"), {"sqlite_autoincrement": True})
+
 class Attachment(Base):
     __tablename__ = "attachments"
     attachment_id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.task_id"), nullable=False)
-    file_path = Column(String, nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.task_id"), nullable=False, index=True)
+    file_path = Column(String, nullable=False) # Для новых файлов — путь объекта относительно UPLOAD_FOLDER
     uploaded_at = Column(DateTime, default=datetime.utcnow)
+    original_name = Column(String, nullable=True)
+    size = Column(BigInteger, nullable=True)
+    sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True, index=True)
 
-    task = relationship("Task", back_populates="attachments")
\ No newline at end of file
+    task = relationship("Task", back_populates="attachments")
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
+# ---- Архив выполненных задач (archive.py) ----
+# Колонки повторяют рабочие таблицы (id сохраняются, чтобы задачу можно было вернуть),
+# плюс время переноса. Новую колонку Task/Comment/Attachment нужно добавить и сюда.
+class ArchivedTask(Base):
+    __tablename__ = "archived_tasks"
+    task_id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    project_id = Column(Integer, ForeignKey("projects.project_id"), nullable=False, index=True)
+    assignee_id = Column(Integer, ForeignKey("users.user_id"), nullable=True)
+    priority_id = Column(Integer, ForeignKey("priorities.priority_id"), nullable=True)
+    status_id = Column(Integer, ForeignKey("statuses.status_id"), nullable=True)
+    due_date = Column(DateTime, nullable=True)
+    is_completed = Column(Boolean, default=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    completed_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    assignee = relationship("User")
+
+class ArchivedComment(Base):
+    __tablename__ = "archived_comments"
+    comment_id = Column(Integer, primary_key=True, autoincrement=False)
+    task_id = Column(Integer, ForeignKey("archived_tasks.task_id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ArchivedAttachment(Base):
+    __tablename__ = "archived_attachments"
+    attachment_id = Column(Integer, primary_key=True, autoincrement=False)
+    task_id = Column(Integer, ForeignKey("archived_tasks.task_id"), nullable=False, index=True)
+    file_path = Column(String, nullable=False)
+    uploaded_at = Column(DateTime, default=datetime.utcnow)
+    original_name = Column(String, nullable=True)
+    size = Column(BigInteger, nullable=True)
+    sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True, index=True)
+
+# ---- История задач и аналитика (analytics.py) ----
+# Журнал только дополняется. task_id без внешнего ключа: события остаются и у задач в архиве.
+# kind: created, baseline (задача появилась до журнала или пришла импортом — время создания
+# неизвестно), completed, reopened, updated (смена статуса, приоритета или исполнителя).
+# status_id, priority_id, assignee_id — состояние задачи после события.
+# rolled_up — событие уже учтено в project_snapshots.
+class TaskEvent(Base):
+    __tablename__ = "task_events"
+    event_id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False, index=True)
+    project_id = Column(Integer, ForeignKey("projects.project_id"), nullable=False)
+    status_id = Column(Integer, ForeignKey("statuses.status_id"), nullable=True)
+    priority_id = Column(Integer, ForeignKey("priorities.priority_id"), nullable=True)
+    assignee_id = Column(Integer, ForeignKey("users.user_id"), nullable=True)
+    kind = Column(String(16), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    rolled_up = Column(Boolean, nullable=False, default=False, server_default=false())
+
+    # Ещё не свёрнутые события — маленький частичный индекс вместо индекса по всему журналу
+    __table_args__ = (Index("ix_task_events_pending", "project_id", "event_id",
+                            postgresql_where=rolled_up == false(), sqlite_where=rolled_up == false()),)
+
+# Итоги проекта за день (UTC). cycle_hist — JSON-гистограмма времени от создания
+# до выполнения по корзинам analytics.CYCLE_BUCKETS_HOURS
+class ProjectSnapshot(Base):
+    __tablename__ = "project_snapshots"
+    project_id = Column(Integer, ForeignKey("projects.project_id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    created = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    reopened = Column(Integer, nullable=False, default=0)
+    cycle_hist = Column(Text, nullable=True)
+
+# Файл в хранилище по содержимому (storage.py); ref_count — число ссылающихся вложений
+class Blob(Base):
+    __tablename__ = "blobs"
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+
+# Счётчики для шапки дашборда, поддерживаются функциями записи в crud.py
+class Counter(Base):
+    __tablename__ = "counters"
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+# Версия схемы БД; записывается командой "flask bootstrap" (bootstrap.py)
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
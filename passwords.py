@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+# Стоимость bcrypt (log2 числа раундов). Хэши с другой стоимостью
+# пересчитываются при успешном входе (см. needs_rehash).
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# bcrypt выполняется в отдельных процессах, чтобы не держать GIL и потоки веб-воркера.
+# PASSWORD_WORKERS=0 — считать прямо в потоке запроса (удобно для разработки).
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Сколько операций может ждать в очереди пула; сверх этого запрос отклоняется сразу
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", str(max(PASSWORD_WORKERS, 1) * 4)))
+
+
+class PasswordBackendBusy(Exception):
+    """Очередь пула переполнена — запрос нужно отклонить, а не копить."""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_QUEUE_LIMIT)
+
+
+# Функции верхнего уровня — их выполняют процессы пула
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _check(hashed: bytes, password: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Не fork: пул создаётся при первом запросе, когда в воркере уже есть потоки,
+            # и копия чужих блокировок в дочернем процессе может зависнуть. forkserver
+            # порождает процессы из чистого однопоточного сервера, которому нужен только bcrypt.
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["passwords"])
+            else:
+                context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS, mp_context=context)
+        return _pool
+
+def _run(fn, *args):
+    if PASSWORD_WORKERS <= 0:
+        return fn(*args)
+    if not _slots.acquire(blocking=False):
+        raise PasswordBackendBusy()
+    try:
+        return _get_pool().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def hash_password(password: str, rounds: int | None = None) -> str:
+    return _run(_hash, password.encode("utf-8"), rounds or BCRYPT_ROUNDS).decode("utf-8")
+
+def verify_password(hashed_password: str, password: str) -> bool:
+    try:
+        return _run(_check, hashed_password.encode("utf-8"), password.encode("utf-8"))
+    except ValueError: # Повреждённый или не-bcrypt хэш
+        return False
+
+# Стоимость из хэша вида $2b$12$...
+def hash_rounds(hashed_password: str) -> int | None:
+    parts = hashed_password.split("$")
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+def needs_rehash(hashed_password: str) -> bool:
+    return hash_rounds(hashed_password) != BCRYPT_ROUNDS
@@ -0,0 +1,151 @@
+"""
+Полнотекстовый поиск по задачам (title, description) и комментариям (content).
+
+PostgreSQL: вычисляемые колонки search_vector (tsvector) в tasks и comments
+с GIN-индексами — значения пересчитывает сама БД при каждой записи.
+SQLite: FTS5-таблицы tasks_fts / comments_fts с внешним содержимым,
+синхронизируются триггерами. В обоих случаях индекс обновляется любым путём
+записи, включая массовый импорт.
+"""
+import re
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE = 50
+SEARCH_CANDIDATES = 2000 # На источник; не меньше SEARCH_PAGE_SIZE * SEARCH_MAX_PAGE
+SEARCH_CONFIG = "simple" # Без стемминга: в данных смешаны русский и английский
+
+_PG_SCHEMA = [
+    f"""ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING GIN (search_vector)",
+    f"""ALTER TABLE comments ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', coalesce(content, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_comments_search_vector ON comments USING GIN (search_vector)",
+]
+
+_SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(title, description, content='tasks', content_rowid='task_id')",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.task_id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.task_id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.task_id, old.title, old.description);
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.task_id, new.title, new.description);
+    END""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(content, content='comments', content_rowid='comment_id')",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_ai AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts(rowid, content) VALUES (new.comment_id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_ad AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.comment_id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_au AFTER UPDATE OF content ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.comment_id, old.content);
+        INSERT INTO comments_fts(rowid, content) VALUES (new.comment_id, new.content);
+    END""",
+]
+
+
+def ensure_schema(conn):
+    """Создаёт поисковые колонки/таблицы и индексы, если их ещё нет (вызывается из bootstrap)."""
+    if conn.dialect.name == "postgresql":
+        for ddl in _PG_SCHEMA:
+            conn.execute(text(ddl))
+    elif conn.dialect.name == "sqlite":
+        created = not conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'")).first()
+        for ddl in _SQLITE_SCHEMA:
+            conn.execute(text(ddl))
+        if created:
+            _rebuild_sqlite(conn)
+
+def _rebuild_sqlite(conn):
+    conn.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"))
+    conn.execute(text("INSERT INTO comments_fts(comments_fts) VALUES ('rebuild')"))
+
+def rebuild(engine):
+    """Перестраивает индекс с нуля (на PostgreSQL колонки вычисляемые — достаточно REINDEX)."""
+    with engine.begin() as conn:
+        ensure_schema(conn)
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("REINDEX INDEX ix_tasks_search_vector"))
+            conn.execute(text("REINDEX INDEX ix_comments_search_vector"))
+        elif conn.dialect.name == "sqlite":
+            _rebuild_sqlite(conn)
+
+
+def _terms(query: str):
+    return re.findall(r"\w+", query.lower())[:10]
+
+# Из каждого источника берутся :n самых новых совпадений (по ним одним и
+# считается релевантность), из них — :k лучших (k = offset + limit — этого
+# достаточно для точной страницы); с задачами соединяется только сама страница.
+_PG_CANDIDATES = f"""
+            (SELECT {{kind}} AS kind, m.doc_id, ts_rank(m.search_vector, q) AS score
+             FROM (SELECT {{id}} AS doc_id, search_vector FROM {{table}}
+                   WHERE search_vector @@ to_tsquery('{SEARCH_CONFIG}', :q)
+                   ORDER BY {{id}} DESC LIMIT :n) m, to_tsquery('{SEARCH_CONFIG}', :q) q
+             ORDER BY score DESC, m.doc_id DESC LIMIT :k)"""
+
+_PG_SEARCH = f"""
+    SELECT h.kind, t.task_id, h.doc_id, t.title,
+           left(CASE WHEN h.kind = 'task' THEN coalesce(t.description, '') ELSE c.content END, 200) AS excerpt,
+           h.score
+    FROM (
+        SELECT kind, doc_id, score FROM ({_PG_CANDIDATES.format(kind="'task'", id="task_id", table="tasks")}
+            UNION ALL{_PG_CANDIDATES.format(kind="'comment'", id="comment_id", table="comments")}
+        ) candidates
+        ORDER BY score DESC, doc_id DESC
+        LIMIT :limit OFFSET :offset
+    ) h
+    LEFT JOIN comments c ON h.kind = 'comment' AND c.comment_id = h.doc_id
+    JOIN tasks t ON t.task_id = CASE WHEN h.kind = 'task' THEN h.doc_id ELSE c.task_id END
+    ORDER BY h.score DESC, h.doc_id DESC
+"""
+
+# bm25() в SQLite (столбец rank): чем меньше, тем релевантнее. FTS5 отдаёт
+# совпадения в порядке rowid и считает rank только для прочитанных строк.
+_SQLITE_CANDIDATES = """
+            SELECT * FROM (SELECT kind, doc_id, score FROM (
+                               SELECT {kind} AS kind, rowid AS doc_id, rank AS score
+                               FROM {fts} WHERE {fts} MATCH :q ORDER BY rowid DESC LIMIT :n)
+                           ORDER BY score, doc_id DESC LIMIT :k)"""
+
+_SQLITE_SEARCH = f"""
+    SELECT h.kind, t.task_id, h.doc_id, t.title,
+           substr(CASE WHEN h.kind = 'task' THEN coalesce(t.description, '') ELSE c.content END, 1, 200) AS excerpt,
+           h.score
+    FROM (
+        SELECT kind, doc_id, score FROM ({_SQLITE_CANDIDATES.format(kind="'task'", fts="tasks_fts")}
+            UNION ALL{_SQLITE_CANDIDATES.format(kind="'comment'", fts="comments_fts")}
+        )
+        ORDER BY score ASC, doc_id DESC
+        LIMIT :limit OFFSET :offset
+    ) h
+    LEFT JOIN comments c ON h.kind = 'comment' AND c.comment_id = h.doc_id
+    JOIN tasks t ON t.task_id = CASE WHEN h.kind = 'task' THEN h.doc_id ELSE c.task_id END
+    ORDER BY h.score ASC, h.doc_id DESC
+"""
+
+def search(db: Session, query: str, page: int = 1, page_size: int = SEARCH_PAGE_SIZE):
+    """
+    Ранжированный поиск; каждое слово запроса ищется как префикс.
+    Возвращает (строки результата, есть_ли_следующая_страница).
+    """
+    terms = _terms(query)
+    if not terms:
+        return [], False
+    page = max(1, min(page, SEARCH_MAX_PAGE))
+    if db.get_bind().dialect.name == "postgresql":
+        sql, q = _PG_SEARCH, " & ".join(f"{t}:*" for t in terms)
+    else:
+        sql, q = _SQLITE_SEARCH, " ".join(f'"{t}"*' for t in terms)
+    offset = (page - 1) * page_size
+    rows = db.execute(text(sql), {"q": q, "n": SEARCH_CANDIDATES, "k": offset + page_size + 1,
+                                  "limit": page_size + 1, "offset": offset}).all()
+    return rows[:page_size], len(rows) > page_size and page < SEARCH_MAX_PAGE
@@ -0,0 +1,184 @@
+"""
+Генератор синтетических данных для нагрузочных проверок.
+
+    python seed.py --size medium
+    python seed.py --tasks 200000 --comments 1000000 --skew 1.2
+
+База берётся из DATABASE_URL (SQLite или PostgreSQL); схема создаётся через bootstrap. Размеры проектов
+распределены по закону Ципфа: несколько огромных проектов и длинный хвост
+маленьких. Строки вставляются пачками через executemany, в обход bcrypt и
+поштучных коммитов crud.
+"""
+import argparse
+import io
+import os
+import random
+import time
+from collections import Counter
+from itertools import accumulate
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, func
+
+PRESETS = {
+    "small": dict(teams=5, users=50, projects=20, tasks=2_000, comments=10_000, attachments=500),
+    "medium": dict(teams=20, users=1_000, projects=200, tasks=50_000, comments=250_000, attachments=10_000),
+    "large": dict(teams=50, users=20_000, projects=1_000, tasks=500_000, comments=1_000_000, attachments=50_000),
+}
+CHUNK = 10_000
+WORDS = ("api auth bug cache deploy docs fix flaky login migration mobile perf query release "
+         "report review search sync timeout ui upload webhook ошибка сборка релиз тест отчёт").split()
+
+
+def _text(rnd, n):
+    return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+def _chunks(rows, size=CHUNK):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _insert(db, model, rows):
+    total = 0
+    for batch in _chunks(rows):
+        db.execute(insert(model.__table__), batch)
+        db.commit()
+        total += len(batch)
+    return total
+
+# Накопленные веса Ципфа: random.choices(cum_weights=...) тогда работает за O(log n)
+def _zipf_cum_weights(n, skew):
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+def seed(db, upload_folder, teams, users, projects, tasks, comments, attachments, skew=1.1, seed_value=42):
+    from models import User, Team, Project, Task, Priority, Status, Role, Comment, Attachment, TaskEvent
+    from crud import add_blob_ref, rebuild_counters, refdata_cache
+    from analytics import rollup
+    from passwords import hash_password
+    from storage import save_stream
+
+    rnd = random.Random(seed_value)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    report = {}
+
+    base_team = db.execute(select(func.coalesce(func.max(Team.team_id), 0))).scalar()
+    report["teams"] = _insert(db, Team, ({"name": f"Team {base_team + i}"} for i in range(1, teams + 1)))
+    team_ids = db.execute(select(Team.team_id)).scalars().all()
+
+    # Один хэш на всех: bcrypt для каждого пользователя занял бы часы
+    password = hash_password("password")
+    role_id = db.execute(select(Role.role_id).where(Role.name == "developer")).scalar()
+    base_user = db.execute(select(func.coalesce(func.max(User.user_id), 0))).scalar()
+    report["users"] = _insert(db, User, ({
+        "first_name": rnd.choice(("Анна", "Иван", "Мария", "Пётр", "Alex", "Sam", "Kim", "Lee")),
+        "last_name": f"User{base_user + i}",
+        "email": f"user{base_user + i}@example.com",
+        "password": password,
+        "role_id": role_id,
+    } for i in range(1, users + 1)))
+    user_ids = db.execute(select(User.user_id)).scalars().all()
+
+    report["projects"] = _insert(db, Project, ({
+        "name": f"Project {i} {_text(rnd, 2)}",
+        "description": _text(rnd, 12),
+        "team_id": rnd.choice(team_ids),
+        "due_date": now + timedelta(days=rnd.randint(-60, 365)),
+    } for i in range(1, projects + 1)))
+    project_ids = db.execute(select(Project.project_id).order_by(Project.project_id.desc()).limit(projects)).scalars().all()
+
+    priority_ids = db.execute(select(Priority.priority_id)).scalars().all()
+    status_ids = db.execute(select(Status.status_id)).scalars().all()
+    weights = _zipf_cum_weights(len(project_ids), skew)
+    def task_rows():
+        for _ in range(tasks):
+            completed = rnd.random() < 0.4
+            yield {
+                "title": _text(rnd, 4),
+                "description": _text(rnd, 20),
+                "project_id": rnd.choices(project_ids, cum_weights=weights)[0],
+                "assignee_id": rnd.choice(user_ids) if rnd.random() < 0.9 else None,
+                "priority_id": rnd.choice(priority_ids),
+                "status_id": rnd.choice(status_ids),
+                "due_date": now + timedelta(days=rnd.randint(-90, 180)) if rnd.random() < 0.7 else None,
+                "is_completed": completed,
+                # Выполненные за последний год — часть из них уже пора в архив
+                "completed_at": now - timedelta(days=rnd.randint(0, 365)) if completed else None,
+            }
+    report["tasks"] = _insert(db, Task, task_rows())
+    max_task = db.execute(select(func.max(Task.task_id))).scalar()
+    min_task = max_task - tasks + 1
+
+    # История для аналитики: задача создана за час–120 дней до выполнения (или до сегодня)
+    def event_rows():
+        for task_id, project_id, status_id, completed_at in db.execute(
+                select(Task.task_id, Task.project_id, Task.status_id, Task.completed_at).where(Task.task_id >= min_task)).all():
+            row = {"task_id": task_id, "project_id": project_id, "status_id": status_id}
+            yield {**row, "kind": "created", "created_at": (completed_at or now) - timedelta(hours=rnd.randint(1, 24 * 120))}
+            if completed_at:
+                yield {**row, "kind": "completed", "created_at": completed_at}
+    report["task_events"] = _insert(db, TaskEvent, event_rows())
+
+    # Комментарии тоже скошены: у немногих задач длинные обсуждения
+    task_weights = _zipf_cum_weights(min(tasks, 10_000), skew)
+    hot_tasks = list(range(max_task, max_task - len(task_weights), -1))
+    report["comments"] = _insert(db, Comment, ({
+        "task_id": rnd.choices(hot_tasks, cum_weights=task_weights)[0] if rnd.random() < 0.5 else rnd.randint(min_task, max_task),
+        "user_id": rnd.choice(user_ids),
+        "content": _text(rnd, rnd.randint(5, 40)),
+        "created_at": now - timedelta(minutes=rnd.randint(0, 500_000)),
+    } for _ in range(comments)))
+
+    # Вложения ссылаются на небольшой набор настоящих файлов — как дубликаты скриншотов и логов
+    blobs = [save_stream(io.BytesIO(_text(rnd, 2000).encode()), upload_folder) for _ in range(20)]
+    refs = [rnd.choice(blobs) for _ in range(attachments)]
+    report["attachments"] = _insert(db, Attachment, ({
+        "task_id": rnd.randint(min_task, max_task),
+        "file_path": rel_path,
+        "original_name": f"log-{n}.txt",
+        "size": size,
+        "sha256": sha256,
+        "uploaded_at": now - timedelta(minutes=rnd.randint(0, 500_000)),
+    } for n, (sha256, size, rel_path, _) in enumerate(refs)))
+    for (sha256, size, _, _), count in Counter(refs).items():
+        add_blob_ref(db, sha256, size, count)
+    db.commit()
+
+    rebuild_counters(db)
+    rollup(db)
+    refdata_cache.invalidate()
+    report["seconds"] = round(time.perf_counter() - started, 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=sorted(PRESETS), default="small")
+    for name in PRESETS["small"]:
+        parser.add_argument(f"--{name}", type=int, default=None)
+    parser.add_argument("--skew", type=float, default=1.1, help="показатель Ципфа для размеров проектов")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = dict(PRESETS[args.size])
+    sizes.update({k: getattr(args, k) for k in sizes if getattr(args, k) is not None})
+
+    from bootstrap import bootstrap
+    from database import SessionLocal
+    bootstrap()
+    # Импорт app создаёт приложение и проверяет версию схемы — только после bootstrap
+    from app import UPLOAD_FOLDER
+    db = SessionLocal()
+    report = seed(db, os.getenv("UPLOAD_FOLDER", UPLOAD_FOLDER), skew=args.skew, seed_value=args.seed, **sizes)
+    db.close()
+    print(", ".join(f"{k}={v}" for k, v in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+// Подсказки для поля исполнителя (templates/_assignee_input.html): запрос к /users/search
+// после паузы в наборе; выбранный вариант записывает user_id в скрытое поле
+(function () {
+  document.querySelectorAll("[data-assignee]").forEach(function (box, n) {
+    var hidden = box.querySelector('input[type="hidden"]');
+    var input = box.querySelector('input[type="search"]');
+    var list = box.querySelector("datalist");
+    var ids = {};
+    var timer = null;
+    list.id = "assignee-options-" + n;
+    input.setAttribute("list", list.id);
+
+    function fill(users) {
+      list.textContent = "";
+      ids = {};
+      var options = (box.dataset.clearLabel ? [{label: box.dataset.clearLabel, id: "none"}] : []).concat(
+        users.map(function (u) { return {label: u.name + " <" + u.email + ">", id: u.user_id}; }));
+      options.forEach(function (o) {
+        var option = document.createElement("option");
+        option.value = o.label;
+        ids[o.label] = o.id;
+        list.appendChild(option);
+      });
+    }
+
+    fill([]);
+    input.addEventListener("input", function () {
+      hidden.value = ids[input.value] || "";
+      clearTimeout(timer);
+      var q = input.value.trim();
+      if (hidden.value || !q) return;
+      timer = setTimeout(function () {
+        var params = new URLSearchParams({q: q});
+        if (box.dataset.teamId) params.set("team_id", box.dataset.teamId);
+        fetch(box.dataset.searchUrl + "?" + params)
+          .then(function (r) { return r.ok ? r.json() : []; })
+          .then(fill);
+      }, 150);
+    });
+  });
+})();
@@ -0,0 +1,10 @@
+// Флажок "выбрать все" в заголовке таблицы задач (массовое изменение, /tasks/bulk)
+(function () {
+  document.querySelectorAll("[data-select-all]").forEach(function (master) {
+    master.addEventListener("change", function () {
+      document.querySelectorAll('input[name="' + master.dataset.selectAll + '"]').forEach(function (box) {
+        box.checked = master.checked;
+      });
+    });
+  });
+})();
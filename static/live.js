@@ -0,0 +1,62 @@
+// Живые обновления страниц проекта и задачи по Server-Sent Events (events.py)
+(function () {
+  var root = document.querySelector("[data-events-url]");
+  if (!root || !window.EventSource) return;
+  var source = new EventSource(root.dataset.eventsUrl);
+
+  function el(tag, className, text) {
+    var node = document.createElement(tag);
+    if (className) node.className = className;
+    if (text) node.textContent = text;
+    return node;
+  }
+
+  function append(list, id, node, atTop) {
+    // Событие могло прийти для уже отрисованной строки (запись успела попасть в страницу)
+    if (!list || document.getElementById(id)) return;
+    var empty = list.querySelector("[data-empty]");
+    if (empty) empty.remove();
+    node.id = id;
+    list.insertBefore(node, atTop ? list.firstChild : null);
+  }
+
+  // Сервер не может досылать пропущенное (переполнение очереди, перезапуск) — берём страницу заново
+  source.addEventListener("reset", function () {
+    source.close();
+    location.reload();
+  });
+
+  source.addEventListener("task", function (e) {
+    var data = JSON.parse(e.data);
+    document.querySelectorAll('[data-toggle-task="' + data.task_id + '"]').forEach(function (btn) {
+      btn.classList.toggle(btn.dataset.on, data.is_completed);
+      btn.classList.toggle(btn.dataset.off, !data.is_completed);
+      btn.textContent = data.is_completed ? btn.dataset.onText : btn.dataset.offText;
+    });
+  });
+
+  source.addEventListener("comment", function (e) {
+    var data = JSON.parse(e.data);
+    var card = el("div", "card mb-2 bg-light");
+    var body = el("div", "card-body p-2");
+    body.appendChild(el("small", "text-muted", data.author + " в " + data.created_at));
+    body.appendChild(el("p", "mb-0", data.content));
+    card.appendChild(body);
+    // Комментарии идут от новых к старым; на страницах более ранних новые не показываем
+    var list = document.querySelector("#comments[data-live]");
+    append(list, "comment-" + data.comment_id, card, true);
+  });
+
+  source.addEventListener("attachment", function (e) {
+    var data = JSON.parse(e.data);
+    var item = el("li", "list-group-item d-flex justify-content-between align-items-center");
+    var link = el("a");
+    link.href = data.url;
+    link.target = "_blank";
+    link.appendChild(el("i", "bi bi-file-earmark"));
+    link.appendChild(document.createTextNode(" " + data.name));
+    item.appendChild(link);
+    item.appendChild(el("small", "text-muted", data.size + " · " + data.uploaded_at));
+    append(document.getElementById("attachments"), "attachment-" + data.attachment_id, item);
+  });
+})();
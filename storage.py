@@ -0,0 +1,97 @@
+"""
+Хранилище вложений с адресацией по содержимому.
+
+Файл пишется на диск частями, SHA-256 считается во время записи;
+итоговый путь — objects/ab/cd/<sha256>, поэтому одинаковые файлы
+хранятся один раз (число ссылок ведётся в таблице blobs).
+
+Файлы без ссылок (например, если запись в БД после загрузки не прошла)
+сразу не удаляются: одновременная загрузка того же содержимого могла ещё
+не закоммитить свою ссылку. Их убирает сборщик crud.gc_blobs
+(flask --app app gc-blobs), не трогая файлы, изменённые за последние
+BLOB_GC_GRACE_SECONDS; save_stream обновляет mtime уже существующего файла.
+"""
+import hashlib
+import os
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", str(24 * 3600)))
+
+
+def blob_path(sha256: str) -> str:
+    """Путь объекта относительно корня хранилища."""
+    return os.path.join("objects", sha256[:2], sha256[2:4], sha256)
+
+def save_stream(stream, root: str):
+    """
+    Сохраняет поток в хранилище. Возвращает (sha256, размер, относительный путь, создан_ли_новый_файл).
+    """
+    tmp_dir = os.path.join(root, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+
+    sha256 = digest.hexdigest()
+    rel_path = blob_path(sha256)
+    final_path = os.path.join(root, rel_path)
+    try:
+        # Такой файл уже есть — новая копия не нужна. Обновлённый mtime не даст сборщику
+        # удалить файл, пока ссылка на него не закоммичена
+        os.utime(final_path)
+    except FileNotFoundError:
+        pass
+    else:
+        os.unlink(tmp.name)
+        return sha256, size, rel_path, False
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(tmp.name, final_path)
+    return sha256, size, rel_path, True
+
+
+def _stale(path: str, older_than: float) -> bool:
+    try:
+        return os.stat(path).st_mtime < older_than
+    except FileNotFoundError:
+        return False
+
+def stale_objects(root: str, older_than: float):
+    """SHA-256 объектов, не изменявшихся с момента older_than (timestamp)."""
+    for dirpath, _, filenames in os.walk(os.path.join(root, "objects")):
+        for name in filenames:
+            if _stale(os.path.join(dirpath, name), older_than):
+                yield name
+
+def remove_object(root: str, sha256: str, older_than: float) -> bool:
+    """Удаляет объект, если его mtime всё ещё старше older_than."""
+    path = os.path.join(root, blob_path(sha256))
+    if not _stale(path, older_than):
+        return False
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+def remove_stale_tmp(root: str, older_than: float) -> int:
+    """Удаляет временные файлы прерванных загрузок."""
+    tmp_dir = os.path.join(root, "tmp")
+    removed = 0
+    for name in os.listdir(tmp_dir) if os.path.isdir(tmp_dir) else ():
+        path = os.path.join(tmp_dir, name)
+        if _stale(path, older_than):
+            os.unlink(path)
+            removed += 1
+    return removed
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Отдельная база SQLite на время тестов; задаётся до импорта database
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.pop("DATABASE_REPLICA_URL", None)
@@ -0,0 +1,70 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import insert, select, func
+
+from analytics import CYCLE_BUCKETS_HOURS, _percentiles, report, rollup
+from bootstrap import upgrade
+from database import SessionLocal
+from models import Project, ProjectSnapshot, TaskEvent
+
+TODAY = date(2026, 3, 31)
+DONE_AT = datetime(2026, 3, 20, 12)
+
+
+@pytest.fixture
+def db():
+    upgrade()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def _add_cycles(db, project_id, first_task_id, hours):
+    """Задачи, выполненные в DONE_AT через заданное число часов после создания."""
+    rows = []
+    for task_id, h in enumerate(hours, first_task_id):
+        rows.append({"task_id": task_id, "project_id": project_id, "kind": "created",
+                     "created_at": DONE_AT - timedelta(hours=h)})
+        rows.append({"task_id": task_id, "project_id": project_id, "kind": "completed", "created_at": DONE_AT})
+    db.execute(insert(TaskEvent.__table__), rows)
+    db.commit()
+
+
+def _snapshot_totals(db, project_id):
+    return db.execute(select(func.sum(ProjectSnapshot.created), func.sum(ProjectSnapshot.completed))
+                      .where(ProjectSnapshot.project_id == project_id)).one()
+
+
+def test_percentiles_interpolate_within_bucket():
+    hist = np.zeros(len(CYCLE_BUCKETS_HOURS) + 1, dtype=np.int64)
+    hist[5] = 10 # (16, 24] ч: 16 + 8 * доля
+    assert _percentiles(hist) == {"p50": 20.0, "p85": 22.8, "p95": 23.6}
+    assert _percentiles(hist * 0) == {"p50": None, "p85": None, "p95": None}
+
+
+def test_rollup_twice_does_not_double_count(db):
+    project = Project(name="Analytics")
+    db.add(project)
+    db.commit()
+    pid = project.project_id
+
+    # 10 задач по 30 ч — корзина (24, 48]
+    _add_cycles(db, pid, 900_001, [30] * 10)
+    assert rollup(db) > 0
+    assert tuple(_snapshot_totals(db, pid)) == (10, 10)
+
+    # ещё 8 задач по 60 ч — (48, 72] — и 2 дольше года — корзина за 8760 ч
+    _add_cycles(db, pid, 900_011, [60] * 8 + [9000] * 2)
+    pending = report(db, [pid], days=30, today=TODAY)
+    assert rollup(db) > 0
+    assert rollup(db) == 0
+    assert tuple(_snapshot_totals(db, pid)) == (20, 20)
+
+    rolled = report(db, [pid], days=30, today=TODAY)
+    assert rolled == pending
+    assert sum(rolled["completed"]) == 20
+    # 20 значений, накопленно: 10 | 18 | 20. p50: ранг 10 -> 24 + 24 * 10/10;
+    # p85: ранг 17 -> 48 + 24 * 7/8; p95: ранг 19 — в корзине переполнения, её нижняя граница
+    assert rolled["cycle_time_hours"] == {"count": 20, "p50": 48.0, "p85": 69.0, "p95": 8760.0}
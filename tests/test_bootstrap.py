@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+from sqlalchemy import create_engine, inspect, text
+
+from bootstrap import upgrade, SCHEMA_VERSION
+
+
+def test_upgrade_adds_attachment_columns():
+    engine = create_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "old.db"))
+    with engine.begin() as conn:
+        # Вложения до хранилища по содержимому: только путь к файлу
+        conn.execute(text("CREATE TABLE attachments (attachment_id INTEGER PRIMARY KEY, task_id INTEGER NOT NULL, "
+                          "file_path VARCHAR NOT NULL, uploaded_at DATETIME)"))
+        conn.execute(text("INSERT INTO attachments (task_id, file_path) VALUES (1, '/srv/uploads/report.pdf')"))
+
+    assert upgrade(engine) == (None, SCHEMA_VERSION)
+
+    columns = {c["name"] for c in inspect(engine).get_columns("attachments")}
+    assert {"original_name", "size", "sha256"} <= columns
+    assert "blobs" in inspect(engine).get_table_names()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT original_name FROM attachments")).scalar() == "report.pdf"
+        # Таблица пересоздана с AUTOINCREMENT, счётчик продолжает существующие id
+        assert "AUTOINCREMENT" in conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'attachments'")).scalar()
+        assert conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'attachments'")).scalar() == 1
@@ -0,0 +1,24 @@
+from cache import LRUCache
+
+
+def test_pop_during_load_keeps_stale_value_out():
+    cache = LRUCache(maxsize=10)
+    token = cache.token("user:1")  # загрузка началась
+    cache.pop("user:1")            # пользователь изменён, пока шло чтение из БД
+    cache.set("user:1", "старое", token)
+    assert cache.get("user:1") is None
+
+    token = cache.token("user:1")
+    cache.pop("user:2")            # сброс другого ключа загрузке не мешает
+    cache.set("user:1", "новое", token)
+    assert cache.get("user:1") == "новое"
+
+
+def test_generations_are_bounded():
+    cache = LRUCache(maxsize=2)
+    token = cache.token("a")
+    for key in ("x", "y", "z"):
+        cache.pop(key)
+    cache.set("a", 1, token)
+    assert cache.get("a") is None
+    assert len(cache._generations) <= 2
@@ -0,0 +1,50 @@
+import io
+
+import pytest
+from sqlalchemy import select, func
+
+from bootstrap import upgrade
+from database import SessionLocal
+from importer import import_tasks
+from models import Project, Task
+
+
+@pytest.fixture
+def db():
+    upgrade()
+    session = SessionLocal()
+    if session.query(Project).filter_by(name="P1").first() is None:
+        session.add(Project(name="P1"))
+        session.commit()
+    yield session
+    session.close()
+
+
+def _count(db, title):
+    return db.execute(select(func.count()).select_from(Task).where(Task.title == title)).scalar()
+
+
+def test_ndjson_bad_line_in_the_middle(db):
+    data = "\n".join([
+        '{"title": "imp-a", "project": "P1"}',
+        '{"title": "imp-b", "project": ',      # неверный JSON
+        '["imp-c"]',                           # не объект
+        '{"title": "imp-d", "project": "P1"}',
+    ]).encode() + b'\n{"title": "imp-\xff", "project": "P1"}\n{"title": "imp-e", "project": "P1"}\n'
+    stream = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", errors="surrogateescape", newline="")
+
+    report = import_tasks(db, stream, "ndjson", batch_size=2)
+
+    assert report.rows_ok == 3
+    assert [line_no for line_no, _ in report.errors] == [2, 3, 5]
+    assert all(_count(db, title) == 1 for title in ("imp-a", "imp-d", "imp-e"))
+
+
+def test_csv_invalid_utf8_row(db):
+    data = b"title,project\ncsv-a,P1\ncsv-\xff,P1\ncsv-b,P1\n"
+    stream = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", errors="surrogateescape", newline="")
+
+    report = import_tasks(db, stream, "csv")
+
+    assert report.rows_ok == 2
+    assert [line_no for line_no, _ in report.errors] == [3]
@@ -0,0 +1,51 @@
+import io
+import os
+import time
+
+import pytest
+
+from bootstrap import upgrade
+from crud import add_blob_ref, gc_blobs
+from database import SessionLocal
+from storage import save_stream
+
+
+@pytest.fixture
+def db():
+    upgrade()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def _age(root, rel_path, seconds):
+    past = time.time() - seconds
+    os.utime(os.path.join(root, rel_path), (past, past))
+
+
+def test_gc_keeps_referenced_and_recent_blobs(db, tmp_path):
+    root = str(tmp_path)
+    orphan = save_stream(io.BytesIO(b"orphan"), root)
+    kept = save_stream(io.BytesIO(b"referenced"), root)
+    fresh = save_stream(io.BytesIO(b"fresh orphan"), root)
+    add_blob_ref(db, kept[0], kept[1])
+    db.commit()
+    _age(root, orphan[2], 7200)
+    _age(root, kept[2], 7200)
+
+    assert gc_blobs(db, root, grace_seconds=3600) == 1
+    assert not os.path.exists(os.path.join(root, orphan[2]))
+    assert os.path.exists(os.path.join(root, kept[2]))
+    assert os.path.exists(os.path.join(root, fresh[2]))
+
+
+def test_reupload_of_orphan_survives_gc_before_commit(db, tmp_path):
+    # Старый файл без ссылки; повторная загрузка того же содержимого ещё не закоммитила ссылку
+    root = str(tmp_path)
+    _, _, rel_path, _ = save_stream(io.BytesIO(b"same content"), root)
+    _age(root, rel_path, 7200)
+    _, _, _, created = save_stream(io.BytesIO(b"same content"), root)
+
+    assert created is False
+    assert gc_blobs(db, root, grace_seconds=3600) == 0
+    assert os.path.exists(os.path.join(root, rel_path))
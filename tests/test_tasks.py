@@ -0,0 +1,60 @@
+import pytest
+
+from bootstrap import upgrade
+from crud import (
+    create_project, create_task, flip_task_completed, bulk_update_tasks,
+    get_dashboard_stats, count_dashboard_stats, rebuild_counters,
+)
+from database import SessionLocal
+
+
+@pytest.fixture
+def db():
+    upgrade()
+    session = SessionLocal()
+    rebuild_counters(session)
+    yield session
+    session.close()
+
+
+def _counters(db):
+    stats = get_dashboard_stats(db)
+    # Счётчики, которые ведут функции записи, совпадают с пересчётом по таблицам
+    assert stats == count_dashboard_stats(db)
+    return stats["tasks"], stats["tasks_done"]
+
+
+def test_double_toggle_restores_counters(db):
+    project = create_project(db, "Counters", None, None, None)
+    tasks, done = _counters(db)
+    task = create_task(db, "toggle", None, project.project_id, None, None, None, None)
+    assert _counters(db) == (tasks + 1, done)
+
+    first = flip_task_completed(db, task.task_id)
+    assert first.is_completed and first.completed_at is not None
+    assert _counters(db) == (tasks + 1, done + 1)
+
+    second = flip_task_completed(db, task.task_id)
+    assert not second.is_completed and second.completed_at is None
+    assert _counters(db) == (tasks + 1, done)
+
+
+def test_bulk_update_mixed_completed_and_open(db):
+    project = create_project(db, "Bulk", None, None, None)
+    ids = [create_task(db, f"bulk {i}", None, project.project_id, None, None, None, None).task_id for i in range(4)]
+    flip_task_completed(db, ids[0])
+    flip_task_completed(db, ids[1])
+    tasks, done = _counters(db)
+
+    # Две задачи уже выполнены — переключаются только открытые
+    toggled, _ = bulk_update_tasks(db, ids, is_completed=True)
+    assert sorted(t.task_id for t in toggled) == ids[2:]
+    assert _counters(db) == (tasks, done + 2)
+
+    toggled, _ = bulk_update_tasks(db, ids, is_completed=True)
+    assert toggled == []
+    assert _counters(db) == (tasks, done + 2)
+
+    toggled, _ = bulk_update_tasks(db, ids[1:3], is_completed=False)
+    assert sorted(t.task_id for t in toggled) == ids[1:3]
+    assert _counters(db) == (tasks, done)
@@ -0,0 +1,60 @@
+from concurrent.futures import Future
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from bootstrap import upgrade
+from database import SessionLocal
+from models import Team
+from writebatch import WriteBatcher, after_commit
+
+
+@pytest.fixture
+def db():
+    upgrade()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def _committed(name):
+    # Отдельная сессия видит только закоммиченные строки
+    with SessionLocal() as other:
+        return other.execute(select(Team.team_id).where(Team.name == name)).first() is not None
+
+
+def _run(batcher, *names, log):
+    def add_team(db, name, commit=True):
+        # Сброс регистрируется до flush: у падающей записи он тоже успевает попасть в список
+        after_commit(db, lambda: log.append((name, _committed(name))))
+        db.add(Team(name=name))
+        db.flush()
+        return name
+
+    batch = [(add_team, (name,), {}, Future()) for name in names]
+    batcher.run_batch(batch)
+    return [future for *_, future in batch]
+
+
+def test_batch_commits_before_callbacks(db):
+    log = []
+    futures = _run(WriteBatcher(), "wb-a", "wb-b", log=log)
+
+    assert [f.result() for f in futures] == ["wb-a", "wb-b"]
+    assert log == [("wb-a", True), ("wb-b", True)]
+
+
+def test_failing_item_is_isolated_by_savepoint(db):
+    db.add(Team(name="wb-taken"))
+    db.commit()
+    log = []
+    batcher = WriteBatcher()
+    ok1, failed, ok2 = _run(batcher, "wb-1", "wb-taken", "wb-2", log=log)
+
+    assert ok1.result() == "wb-1" and ok2.result() == "wb-2"
+    assert isinstance(failed.exception(), IntegrityError)
+    assert _committed("wb-1") and _committed("wb-2")
+    # Сброс кэшей откатившейся записи не вызывается, остальные — только после коммита
+    assert log == [("wb-1", True), ("wb-2", True)]
+    assert batcher.stats()["items"] == 3
@@ -0,0 +1,158 @@
+"""
+Групповая запись (group commit) для частых мелких операций: комментарии и
+переключение "готово".
+
+При WRITE_BATCHING=1 запросы не коммитят сами, а ставят запись в очередь.
+Фоновый поток собирает записи параллельных запросов — до WRITE_BATCH_MAX_ITEMS
+штук или за WRITE_BATCH_MAX_DELAY_MS миллисекунд — и выполняет их одной
+транзакцией: один fsync на пачку вместо одного на запись. Запрос получает
+ответ только после коммита пачки. Если одна из записей падает, пачка
+повторяется с точкой сохранения (SAVEPOINT) на каждую запись, поэтому
+ошибка одной не откатывает остальные.
+
+Функция записи должна принимать commit=False и только делать flush.
+То, что можно делать только после коммита (сброс кэшей), она регистрирует
+через after_commit(db, fn) — функции вызываются, когда пачка закоммичена.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCHING = os.getenv("WRITE_BATCHING", "0") == "1"
+WRITE_BATCH_MAX_ITEMS = int(os.getenv("WRITE_BATCH_MAX_ITEMS", "100"))
+WRITE_BATCH_MAX_DELAY_MS = float(os.getenv("WRITE_BATCH_MAX_DELAY_MS", "5"))
+
+AFTER_COMMIT = "writebatch_after_commit" # Ключ в Session.info
+
+
+class WriteBatcher:
+    def __init__(self, session_factory=SessionLocal, max_items=WRITE_BATCH_MAX_ITEMS,
+                 max_delay=WRITE_BATCH_MAX_DELAY_MS / 1000):
+        self.session_factory = session_factory
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # Поток не переживает fork: воркер, созданный после импорта, запускает свой
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._loop, name="writebatch", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Выполняет fn(db, *args, commit=False, **kwargs) в ближайшей пачке и ждёт коммита.
+        Без таймаута: поставленная в очередь запись всё равно будет выполнена, и ответ
+        "ошибка" на закоммиченную запись хуже ожидания. Зависший запрос к БД ограничивают
+        таймауты БД и воркера.
+        """
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_items:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            try:
+                self.run_batch(batch)
+            except Exception as e: # Поток не должен умереть: иначе все следующие запросы повиснут
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def run_batch(self, batch):
+        """
+        Вся пачка одной транзакцией. Если какая-то запись упала, пачка повторяется
+        с точкой сохранения на каждую запись — ошибка достаётся только её автору.
+        """
+        # expire_on_commit=False: объекты остаются заполненными после коммита, без refresh()
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            try:
+                results = [(future, fn(db, *args, commit=False, **kwargs), None) for fn, args, kwargs, future in batch]
+                db.commit()
+            except Exception:
+                db.rollback()
+                db.info.pop(AFTER_COMMIT, None)
+                results = self._run_isolated(db, batch)
+            callbacks = db.info.pop(AFTER_COMMIT, [])
+        except Exception as e:
+            db.rollback()
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+        self.batches += 1
+        self.items += len(batch)
+        # До ответа запросам: когда запрос получит ответ, кэши уже сброшены
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Ошибка в after_commit")
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _run_isolated(self, db, batch):
+        results = []
+        for fn, args, kwargs, future in batch:
+            callbacks = len(db.info.get(AFTER_COMMIT, []))
+            try:
+                with db.begin_nested():
+                    results.append((future, fn(db, *args, commit=False, **kwargs), None))
+            except Exception as e:
+                del db.info.get(AFTER_COMMIT, [])[callbacks:] # Запись откатилась — её сброс кэшей не нужен
+                results.append((future, None, e))
+        db.commit()
+        return results
+
+    def stats(self):
+        return {"batches": self.batches, "items": self.items, "pending": self._queue.qsize()}
+
+
+batcher = WriteBatcher()
+
+
+def after_commit(db, fn):
+    """Вызывает fn() после коммита пачки, в которой выполняется запись в сессии db."""
+    db.info.setdefault(AFTER_COMMIT, []).append(fn)
+
+
+def execute(db, fn, *args, **kwargs):
+    """Запись fn(db, *args): сразу в сессии запроса или, при WRITE_BATCHING=1, групповым коммитом."""
+    if WRITE_BATCHING:
+        return batcher.submit(fn, *args, **kwargs)
+    return fn(db, *args, **kwargs)